@@ -192,25 +192,34 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize session state
+# Initialize session state: chat history keeps small message dicts only;
+# audio and long text are spilled to disk (see message_store.py)
 if "messages" not in st.session_state:
-    st.session_state.messages = []
+    from message_store import get_message_store
+    st.session_state.messages = get_message_store().history()
 if "mode" not in st.session_state:
     st.session_state.mode = None
-if "rag_initialized" not in st.session_state:
-    st.session_state.rag_initialized = False
+
+KNOWLEDGE_BASE_PATH = "knowledge-base"
+
+# Messages rendered per page of chat history; older pages load on demand
+CHAT_PAGE_SIZE = int(os.getenv("CHAT_PAGE_SIZE", "20"))
+
+# Fragments rerun on their own when a widget inside them is used (Streamlit
+# 1.37+; 1.33-1.36 call it experimental_fragment). Without them, a plain call
+fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda fn: fn)
 
 def initialize_rag():
-    """Initialize the RAG system with knowledge base documents."""
-    from rag_engine import RAGEngine
+    """Return the process-wide RAG engine shared by every session."""
+    from engine_registry import registry
     
-    if not st.session_state.rag_initialized:
+    # The engine and its index are shared read-only across sessions; only the
+    # chat history and mode live in st.session_state
+    if not registry.is_loaded(KNOWLEDGE_BASE_PATH):
         with st.spinner("🔄 Loading knowledge base..."):
-            st.session_state.rag_engine = RAGEngine()
-            st.session_state.rag_engine.load_documents("knowledge-base")
-            st.session_state.rag_initialized = True
+            return registry.get_engine(KNOWLEDGE_BASE_PATH)
     
-    return st.session_state.rag_engine
+    return registry.get_engine(KNOWLEDGE_BASE_PATH)
 
 def render_header():
     """Render the main header."""
@@ -230,10 +239,10 @@ def render_mode_selection():
     with col1:
         if st.button("🎓 Onboarding Mode", use_container_width=True, key="onboard_btn"):
             st.session_state.mode = "onboarding"
-            st.session_state.messages = [{
+            st.session_state.messages.reset([{
                 "role": "assistant",
                 "content": "👋 Welcome to the team! I'm TeamMind AI, your onboarding companion.\n\nI'm here to help you get up to speed quickly. I can answer questions about:\n\n• 🛠️ Setting up your development environment\n• 📋 Team processes and workflows\n• 🔧 Tools and technologies we use\n• 👥 Who to contact for what\n• 📚 Where to find documentation\n\nWhat would you like to know first?"
-            }]
+            }])
             st.rerun()
         st.markdown("""
         <div style="text-align: center; color: #a1a1aa; font-size: 0.9rem; margin-top: 0.5rem;">
@@ -244,10 +253,10 @@ def render_mode_selection():
     with col2:
         if st.button("📚 Knowledge Mode", use_container_width=True, key="knowledge_btn"):
             st.session_state.mode = "knowledge"
-            st.session_state.messages = [{
+            st.session_state.messages.reset([{
                 "role": "assistant",
                 "content": "👋 Hello! I'm TeamMind AI, your team knowledge assistant.\n\nI have access to our team's documentation, including:\n\n• 📖 Technical documentation & architecture\n• 🚀 Deployment processes\n• 💻 Coding standards\n• ❓ FAQs and troubleshooting guides\n\nAsk me anything about our team's processes, tools, or documentation!"
-            }]
+            }])
             st.rerun()
         st.markdown("""
         <div style="text-align: center; color: #a1a1aa; font-size: 0.9rem; margin-top: 0.5rem;">
@@ -261,14 +270,10 @@ def render_mode_selection():
     
     q_col1, q_col2 = st.columns(2)
     
-    quick_topics = [
-        "How do I set up my environment?",
-        "What's the deployment process?",
-        "Who should I contact for help?",
-        "What tools does the team use?"
-    ]
+    # The same questions are answered ahead of time by the warm-up job
+    from warmup import hot_questions
     
-    for i, topic in enumerate(quick_topics):
+    for i, topic in enumerate(hot_questions()):
         col = q_col1 if i % 2 == 0 else q_col2
         with col:
             if st.button(topic, key=f"main_quick_{i}", use_container_width=True):
@@ -276,6 +281,66 @@ def render_mode_selection():
                 st.session_state.messages.append({"role": "user", "content": topic})
                 st.rerun()
 
+def bubble_html(role: str, text: str) -> str:
+    """Chat bubble HTML for a user or assistant message."""
+    if role == "user":
+        return f"""
+        <div style="display: flex; justify-content: flex-end; margin: 1rem 0;">
+            <div class="user-message">{text}</div>
+        </div>
+        """
+    return f"""
+    <div style="display: flex; justify-content: flex-start; margin: 1rem 0;">
+        <div class="assistant-message">{text}</div>
+    </div>
+    """
+
+@st.cache_data(max_entries=4096, show_spinner=False)
+def message_html(message_id: str, _history, _message) -> str:
+    """Bubble HTML for a stored message, built once per message id.
+    
+    Messages never change after they are stored, so the id is a complete
+    cache key; spilled text is only read from disk on a miss.
+    """
+    return bubble_html(_message["role"], _history.content(_message))
+
+@st.cache_data(max_entries=4096, show_spinner=False)
+def sources_markdown(message_id: str, _sources) -> str:
+    """Citations panel markdown for a stored message, built once per message id."""
+    return "\n\n".join(f"**{i+1}. {source['source']}**  \n{source['snippet']}..." for i, source in enumerate(_sources))
+
+@fragment
+def render_message(history, message: dict, play_audio: bool):
+    """One chat message. Widgets are keyed by the message id, and as a
+    fragment a click inside it reruns only this message."""
+    message_id = message["id"]
+    st.markdown(message_html(message_id, history, message), unsafe_allow_html=True)
+    if message["role"] == "user":
+        return
+    
+    # Render sources
+    if message.get("sources"):
+        with st.expander("📚 Sources & Citations"):
+            st.markdown(sources_markdown(message_id, message["sources"]))
+    
+    # Feedback & Attributes
+    if not message.get("is_voice"):
+        cols = st.columns([1, 1, 5])
+        with cols[0]:
+            st.button("👍", key=f"up_{message_id}", help="Helpful")
+        with cols[1]:
+            st.button("👎", key=f"down_{message_id}", help="Not helpful")
+    
+    # Audio is read from disk and sent to the browser only for the latest
+    # narration, or when asked for
+    if "audio_ref" in message:
+        if play_audio or st.toggle("🔊 Play narration", key=f"play_{message_id}"):
+            audio = history.audio(message)
+            if audio:
+                st.audio(audio, format='audio/mp3')
+            else:
+                st.caption("Audio no longer available")
+
 def render_chat():
     """Render the chat interface."""
     # Mode indicator
@@ -288,45 +353,30 @@ def render_chat():
     with col2:
         if st.button("🔄 Switch", key="switch_mode"):
             st.session_state.mode = None
-            st.session_state.messages = []
+            st.session_state.messages.reset()
+            st.session_state.history_pages = 1
             st.rerun()
     
     # Chat messages container
     chat_container = st.container()
+    history = st.session_state.messages
     
     with chat_container:
-        for message in st.session_state.messages:
-            if message["role"] == "user":
-                st.markdown(f"""
-                <div style="display: flex; justify-content: flex-end; margin: 1rem 0;">
-                    <div class="user-message">{message["content"]}</div>
-                </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                <div style="display: flex; justify-content: flex-start; margin: 1rem 0;">
-                    <div class="assistant-message">{message["content"]}</div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                # Render sources
-                if "sources" in message and message["sources"]:
-                    with st.expander("📚 Sources & Citations"):
-                        for i, source in enumerate(message["sources"]):
-                            st.markdown(f"**{i+1}. {source['source']}**")
-                            st.caption(source['content'][:200] + "...")
-                
-                # Feedback & Attributes
-                if message.get("role") == "assistant" and not message.get("is_voice"):
-                    cols = st.columns([1, 1, 5])
-                    with cols[0]:
-                        st.button("👍", key=f"up_{message['content'][:10]}", help="Helpful")
-                    with cols[1]:
-                        st.button("👎", key=f"down_{message['content'][:10]}", help="Not helpful")
-
-                # Render audio if present
-                if "audio" in message:
-                    st.audio(message["audio"], format='audio/mp3')
+        if history.evicted:
+            st.caption(f"🗂️ {history.evicted} earlier messages were cleared to save memory")
+        
+        # Only the latest page(s) are rendered, so a rerun costs the same
+        # however long the conversation gets
+        pages = st.session_state.get("history_pages", 1)
+        start = max(0, len(history) - pages * CHAT_PAGE_SIZE)
+        if start and st.button(f"⬆️ Show earlier messages ({start} more)", key="show_earlier"):
+            st.session_state.history_pages = pages + 1
+            st.rerun()
+        
+        visible = history[start:]
+        latest_audio = next((m["id"] for m in reversed(visible) if "audio_ref" in m), None)
+        for message in visible:
+            render_message(history, message, play_audio=message["id"] == latest_audio)
     
     # Chat input
     user_input = st.chat_input("Ask me anything about the team...")
@@ -338,65 +388,110 @@ def render_chat():
 
     # Generate response if last message is from user
     if st.session_state.messages and st.session_state.messages[-1]["role"] == "user":
-        with st.spinner("Thinking..."):
+        try:
+            # Get last user message
+            last_user_input = st.session_state.messages.content(st.session_state.messages[-1])
+            
+            rag_engine = initialize_rag()
+            
+            # Add context based on mode
+            from rag_engine import MODE_PREFIXES
+            context_prefix = MODE_PREFIXES.get(st.session_state.mode, MODE_PREFIXES["knowledge"])
+            
+            # Quick topics are usually answered (and narrated) ahead of time
+            from engine_registry import registry
+            warmer = registry.warmer(KNOWLEDGE_BASE_PATH)
+            warm = warmer.lookup(rag_engine, last_user_input, context_prefix) if warmer else None
+            if warm is not None:
+                st.session_state.messages.append({
+                    "role": "assistant",
+                    "content": warm["answer"],
+                    "sources": warm["sources"]
+                })
+                if warm["narration"]:
+                    msg_data = {"role": "assistant", "content": f"🎙️ *Narrator:* {warm['narration']}", "is_voice": True}
+                    if warm["audio"]:
+                        msg_data["audio"] = warm["audio"]
+                    st.session_state.messages.append(msg_data)
+                st.rerun()
+            
+            # Stream the answer: the spinner only covers retrieval, then tokens
+            # are rendered into the bubble as they arrive
+            events = rag_engine.query_stream(last_user_input, context_prefix)
+            with st.spinner("Thinking..."):
+                sources = next(events)["sources"]
+            
+            answer_placeholder = st.empty()
+            answer_text = ""
+            narration_text = ""
+            for event in events:
+                if event["type"] == "delta":
+                    answer_text += event["text"]
+                    answer_placeholder.markdown(bubble_html("assistant", f"{answer_text}▌"), unsafe_allow_html=True)
+                elif event["type"] == "done":
+                    answer_text = event["answer"]
+                    sources = event["sources"]
+                    narration_text = event.get("narration", "")
+            
+            # Append answer with sources metadata
+            st.session_state.messages.append({
+                "role": "assistant", 
+                "content": answer_text,
+                "sources": sources
+            })
+            
+            # 🎙️ Voice Narration Feature
             try:
-                # Get last user message
-                last_user_input = st.session_state.messages[-1]["content"]
+                from narration import narrate
+                from voice_engine import get_voice_engine
                 
-                rag_engine = initialize_rag()
+                # Shared client: pooled keep-alive connections, timeouts and retries
+                voice_engine = get_voice_engine()
                 
-                # Add context based on mode
-                context_prefix = ""
-                if st.session_state.mode == "onboarding":
-                    context_prefix = "The user is a new team member going through onboarding. Be welcoming, patient, and thorough in explanations. "
-                else:
-                    context_prefix = "The user is looking for quick information from team documentation. Be concise and direct. "
+                # The script usually comes with the answer; only fall back to a
+                # second model call (streamed sentence by sentence) without one.
+                # Sessions that asked the same question at the same time share
+                # one script and one set of TTS calls; each audio segment is
+                # shown as soon as it comes back
+                pipeline = narrate(
+                    answer_text, narration_text, rag_engine.summarize_for_voice_stream, voice_engine.generate_audio,
+                    key=rag_engine.flight_key(last_user_input, context_prefix)
+                )
+                script_placeholder = st.empty()
+                script_sentences = []
+                audio_segments = []
+                with st.spinner("🎙️ Preparing narration..."):
+                    for sentence, audio_bytes in pipeline:
+                        script_sentences.append(sentence)
+                        script_placeholder.markdown(f"🎙️ *Narrator:* {' '.join(script_sentences)}")
+                        if audio_bytes:
+                            audio_segments.append(audio_bytes)
+                            st.audio(audio_bytes, format='audio/mp3')
                 
-                response_data = rag_engine.query(last_user_input, context_prefix)
-                answer_text = response_data["answer"]
-                sources = response_data["sources"]
+                voice_script = " ".join(script_sentences)
                 
-                # Append answer with sources metadata
-                st.session_state.messages.append({
-                    "role": "assistant", 
-                    "content": answer_text,
-                    "sources": sources
-                })
-                
-                # 🎙️ Voice Narration Feature
-                try:
-                    from voice_engine import VoiceEngine
-                    voice_engine = VoiceEngine()
+                # Add message with audio to history (MP3 segments concatenate cleanly)
+                msg_data = {"role": "assistant", "content": f"🎙️ *Narrator:* {voice_script}", "is_voice": True}
+                if audio_segments:
+                    msg_data["audio"] = b"".join(audio_segments)
                     
-                    # 1. Summarize for voice
-                    voice_script = rag_engine.summarize_for_voice(answer_text)
-                    
-                    # 2. Generate Audio
-                    audio_bytes = voice_engine.generate_audio(voice_script)
-                    
-                    # Add message with audio to history
-                    msg_data = {"role": "assistant", "content": f"🎙️ *Narrator:* {voice_script}", "is_voice": True}
-                    if audio_bytes:
-                        msg_data["audio"] = audio_bytes
-                        # Play immediately for this run too (optional, but good for UX)
-                        
-                    st.session_state.messages.append(msg_data)
-                
-                except Exception as ve:
-                    # Don't crash app if voice fails
-                    print(f"Voice error: {ve}")
+                st.session_state.messages.append(msg_data)
+            
+            except Exception as ve:
+                # Don't crash app if voice fails
+                print(f"Voice error: {ve}")
 
-                # Show initialization error if any
-                if hasattr(rag_engine, 'init_error') and rag_engine.init_error:
-                    st.error(f"⚠️ Watsonx Initialization Error: {rag_engine.init_error}")
-                    st.session_state.messages.append({"role": "assistant", "content": f"Debugging info: {rag_engine.init_error}"})
-                
-                st.rerun()
-                
-            except Exception as e:
-                error_msg = f"I encountered an error: {str(e)}\n\nPlease make sure your IBM API key is configured correctly in the `.env` file."
-                st.session_state.messages.append({"role": "assistant", "content": error_msg})
-                st.rerun()
+            # Show initialization error if any
+            if hasattr(rag_engine, 'init_error') and rag_engine.init_error:
+                st.error(f"⚠️ Watsonx Initialization Error: {rag_engine.init_error}")
+                st.session_state.messages.append({"role": "assistant", "content": f"Debugging info: {rag_engine.init_error}"})
+            
+            st.rerun()
+            
+        except Exception as e:
+            error_msg = f"I encountered an error: {str(e)}\n\nPlease make sure your IBM API key is configured correctly in the `.env` file."
+            st.session_state.messages.append({"role": "assistant", "content": error_msg})
+            st.rerun()
 
 def render_sidebar():
     """Render the sidebar with info and stats."""
@@ -410,30 +505,69 @@ def render_sidebar():
         
         st.markdown("---")
         
-        # Stats
+        # Stats, read from the live index and the process-wide metrics
+        from engine_registry import registry
+        from metrics import metrics
+        
         st.markdown("### 📊 Knowledge Base Stats")
         
+        engine = registry.peek(KNOWLEDGE_BASE_PATH)
+        gauges = engine.metrics_gauges() if engine else {}
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("Documents", "5", delta=None)
+            st.metric("Documents", gauges.get("index_documents", "—"), delta=None)
         with col2:
-            st.metric("Topics", "12", delta=None)
+            st.metric("Topics", gauges.get("index_topics", "—"), delta=None)
         
         st.markdown("")
-        st.metric("Knowledge Gaps", "3", delta="High Priority", delta_color="inverse")
+        gaps = int(metrics.counter("knowledge_gaps_total"))
+        answered = sum(int(metrics.counter("queries_total", outcome=outcome))
+                       for outcome in ("generated", "cached", "coalesced", "prewarmed", "fallback"))
+        st.metric("Knowledge Gaps", gaps,
+                  delta=f"{gaps / answered:.0%} of questions" if answered else None, delta_color="inverse")
+        
+        # Stage latencies since the server started
+        stages = metrics.snapshot()["histograms"].get("stage_seconds", [])
+        if stages:
+            with st.expander("⏱️ Latency (p50 / p95)"):
+                for series in sorted(stages, key=lambda series: series["labels"]["stage"]):
+                    st.caption(f"**{series['labels']['stage']}**: {series['p50']:.2f}s / "
+                               f"{series['p95']:.2f}s ({series['count']} calls)")
+                if "response_cache_hit_ratio" in gauges:
+                    st.caption(f"**answer cache hit ratio**: {gauges['response_cache_hit_ratio']:.0%}")
+        
+        # Quick-topic warm-up: progress while running, then how fresh it is
+        warmer = registry.warmer(KNOWLEDGE_BASE_PATH)
+        status = warmer.status() if warmer else None
+        if status and status["state"] == "running":
+            st.progress(status["done"] / max(1, status["total"]),
+                        text=f"🔥 Warming quick topics ({status['done']}/{status['total']})")
+        elif status and status["state"] == "done":
+            if status["fresh"]:
+                minutes = int(status["age_seconds"] // 60)
+                st.caption(f"🔥 {status['warmed']}/{status['total']} quick answers ready "
+                           f"(warmed {minutes} min ago)" if minutes else
+                           f"🔥 {status['warmed']}/{status['total']} quick answers ready (just warmed)")
+            else:
+                st.caption("🔥 Quick answers are out of date; re-warming after the index update")
+        
+        # Server memory held by this chat (audio and long answers live on disk)
+        usage = st.session_state.messages.usage()
+        st.caption(f"💾 This chat: {usage['messages']} messages, {usage['memory_bytes'] / 1024:.0f} KB in memory, "
+                   f"{usage['spilled_bytes'] / 1024:.0f} KB on disk")
+        
+        if st.button("🔄 Reload Knowledge Base", key="reload_kb", use_container_width=True):
+            with st.spinner("🔄 Rebuilding knowledge base index..."):
+                registry.reload_engine(KNOWLEDGE_BASE_PATH)
+            st.rerun()
         
         st.markdown("---")
         
         # Quick links
         st.markdown("### 🔗 Quick Topics")
-        quick_topics = [
-            "How do I set up my environment?",
-            "What's the deployment process?",
-            "Who should I contact for help?",
-            "What tools does the team use?"
-        ]
+        from warmup import hot_questions
         
-        for topic in quick_topics:
+        for topic in hot_questions():
             if st.button(topic, key=f"quick_{topic}", use_container_width=True):
                 if st.session_state.mode is None:
                     st.session_state.mode = "knowledge"
@@ -460,6 +594,10 @@ def render_sidebar():
 
 def main():
     """Main application entry point."""
+    # Prometheus endpoint on RAG_METRICS_PORT (no-op when unset or already running)
+    from metrics import start_metrics_server
+    start_metrics_server()
+    
     render_sidebar()
     render_header()
     
@@ -0,0 +1,129 @@
+"""
+Audio Cache - Content-addressed on-disk cache for synthesized narration
+
+Files are named by the SHA-256 of everything that determines the audio
+(text, voice_id, model_id, voice_settings), so identical narration is
+synthesized once and every app process pointed at the same directory
+reuses it. Writes go to a temp file and are renamed into place, so readers
+never see partial audio. The directory is kept under a byte budget by
+evicting the least recently used files (reads refresh a file's mtime).
+
+BlobCache is the same store for any bytes (used by message_store.py);
+AudioCache adds the narration key.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+
+class BlobCache:
+    """Size-bounded, content-addressed file cache shared through a directory."""
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024, suffix: str = ".bin"):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Approximate running total; re-measured from disk whenever we evict
+        self._approx_bytes = None
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        # Two-level fan-out keeps directories small
+        return self.directory / key[:2] / f"{key}{self.suffix}"
+
+    def __contains__(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Return cached bytes, or None."""
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            self.misses += 1
+            return None
+        try:
+            # Mark as recently used for LRU eviction
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        """Store bytes atomically, then evict old files if over budget."""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-", suffix=self.suffix)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            if self._approx_bytes is None:
+                self._approx_bytes = self._measure()[0]
+            else:
+                self._approx_bytes += len(data)
+            if self._approx_bytes > self.max_bytes:
+                self._evict()
+
+    def _measure(self):
+        files = []
+        total = 0
+        for path in self.directory.glob(f"*/*{self.suffix}"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        return total, files
+
+    def _evict(self):
+        """Delete least recently used files until the cache is at 90% of its budget."""
+        total, files = self._measure()
+        target = int(self.max_bytes * 0.9)
+        for _, size, path in sorted(files, key=lambda f: f[0]):
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                total -= size
+            except FileNotFoundError:
+                # Another process evicted it first
+                total -= size
+            except OSError:
+                continue
+        self._approx_bytes = total
+
+
+class AudioCache(BlobCache):
+    """Size-bounded, content-addressed MP3 cache shared through a directory."""
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 1024 * 1024):
+        super().__init__(directory, max_bytes=max_bytes, suffix=".mp3")
+
+    @staticmethod
+    def make_key(text: str, voice_id: str, model_id: str, voice_settings: dict) -> str:
+        """Content address for one synthesis request."""
+        payload = json.dumps(
+            {"text": text, "voice_id": voice_id, "model_id": model_id, "voice_settings": voice_settings},
+            sort_keys=True, ensure_ascii=False, separators=(",", ":")
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
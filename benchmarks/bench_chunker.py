@@ -0,0 +1,89 @@
+"""
+Benchmark: streaming token-aware chunker vs the original character chunker
+
+Chunk sizes are counted with tiktoken when it is installed, otherwise with
+the word/punctuation estimate; the counter in use is printed first, since
+throughput differs between the two.
+
+Usage:
+    python -m benchmarks.bench_chunker [--scales 1 10 100] [--repeat 3]
+"""
+
+import argparse
+import time
+
+from benchmarks.corpus import KB_PATH
+from chunker import iter_chunks
+from context_packer import TOKEN_COUNTER
+
+
+def legacy_create_chunks(doc, chunk_size=500, overlap=50):
+    """The original RAGEngine._create_chunks."""
+    chunks = []
+    content = doc["content"]
+    sections = content.split("\n## ")
+    for i, section in enumerate(sections):
+        if i > 0:
+            section = "## " + section
+        if len(section) > chunk_size:
+            words = section.split()
+            current_chunk = []
+            current_length = 0
+            for word in words:
+                current_chunk.append(word)
+                current_length += len(word) + 1
+                if current_length >= chunk_size:
+                    chunks.append({"source": doc["filename"], "content": " ".join(current_chunk)})
+                    current_chunk = current_chunk[-overlap:]
+                    current_length = sum(len(w) + 1 for w in current_chunk)
+            if current_chunk:
+                chunks.append({"source": doc["filename"], "content": " ".join(current_chunk)})
+        else:
+            if section.strip():
+                chunks.append({"source": doc["filename"], "content": section.strip()})
+    return chunks
+
+
+def synthetic_documents(scale):
+    """`scale` copies of every knowledge base file, as (filename, text) pairs."""
+    files = [(path.name, path.read_text(encoding="utf-8")) for path in sorted(KB_PATH.rglob("*.md"))]
+    return [(f"copy-{copy}-{name}", text) for copy in range(scale) for name, text in files]
+
+
+def throughput(run, documents, repeat):
+    """Best-of-`repeat` MB/s and the chunk count of one run."""
+    size_mb = sum(len(text.encode("utf-8")) for _, text in documents) / 1e6
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = run(documents)
+        best = min(best, time.perf_counter() - start)
+    return size_mb / best, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    def run_legacy(documents):
+        return sum(len(legacy_create_chunks({"filename": name, "content": text})) for name, text in documents)
+
+    def run_streaming(documents):
+        # Chunks are consumed one at a time
+        return sum(1 for name, text in documents for _ in iter_chunks(text, name))
+
+    print(f"Token counter: {TOKEN_COUNTER}\n")
+    print(f"{'scale':>6} {'MB':>7} {'legacy MB/s':>12} {'chunks':>8} {'token MB/s':>11} {'chunks':>8} {'ratio':>6}")
+    for scale in args.scales:
+        documents = synthetic_documents(scale)
+        size_mb = sum(len(text.encode("utf-8")) for _, text in documents) / 1e6
+        legacy_rate, legacy_count = throughput(run_legacy, documents, args.repeat)
+        token_rate, token_count = throughput(run_streaming, documents, args.repeat)
+        print(f"{scale:>6} {size_mb:>7.2f} {legacy_rate:>12.1f} {legacy_count:>8} "
+              f"{token_rate:>11.1f} {token_count:>8} {token_rate / legacy_rate:>5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Benchmark: offline end-to-end run of ingest, retrieval, answering and narration
+
+Everything external is replaced by the stand-ins in benchmarks/standins.py
+(model, TTS endpoint, embedder), so no credentials or network are needed.
+For each corpus scale (copies of knowledge-base/) it measures:
+
+- ingest: wall time and throughput of load_documents on a fresh index
+- memory: process RSS growth from loading the index
+- retrieval: p50/p95 latency and recall@k on LABELLED_QUESTIONS, per mode
+- end to end: query() latency, query_stream() time to first token, and
+  query + narration (TTS) latency, with simulated model/TTS latency
+
+Each scale runs in a fresh process so memory numbers don't carry over.
+Results are saved as JSON; --compare prints the change against an earlier
+results file.
+
+Usage:
+    python -m benchmarks.bench_e2e [--scales 10 100 1000] [--modes vector lexical hybrid]
+                                   [--model-latency 0.5] [--tts-latency 0.3]
+                                   [--output results.json] [--compare old.json]
+"""
+
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from benchmarks.corpus import write_corpus
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# (question, files that answer it); a hit is any top-k chunk from one of them
+LABELLED_QUESTIONS = [
+    ("Who is the engineering manager?", {"onboarding-guide.md"}),
+    ("Which tool do we use for production monitoring?", {"onboarding-guide.md"}),
+    ("How do I set up my development environment?", {"onboarding-guide.md", "common-questions.md"}),
+    ("What is the naming convention for Python constants?", {"coding-standards.md"}),
+    ("How should I name a feature branch?", {"coding-standards.md", "common-questions.md"}),
+    ("What format should commit messages follow?", {"coding-standards.md"}),
+    ("What does the payment service do?", {"architecture-overview.md"}),
+    ("What happens when a user places an order?", {"architecture-overview.md"}),
+    ("Which external services do we integrate with?", {"architecture-overview.md"}),
+    ("How is the system secured?", {"architecture-overview.md"}),
+    ("How do I deploy to production?", {"deployment-process.md", "common-questions.md"}),
+    ("How do I roll back a failed deployment?", {"deployment-process.md", "common-questions.md"}),
+    ("What is the hotfix process?", {"deployment-process.md"}),
+    ("What environments do we deploy to?", {"deployment-process.md"}),
+    ("How do I run tests locally?", {"common-questions.md"}),
+    ("How do I create a database migration?", {"common-questions.md"}),
+    ("I can't connect to the database, what should I check?", {"common-questions.md"}),
+    ("What meetings does the team have?", {"common-questions.md"}),
+]
+
+CONTEXT_PREFIX = "The user is looking for quick information from team documentation. Be concise and direct. "
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux), else the peak from getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+    if not ordered:
+        return {"p50": 0.0, "p95": 0.0, "mean": 0.0}
+    return {
+        "p50": round(statistics.median(ordered), 3),
+        "p95": round(ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))], 3),
+        "mean": round(statistics.fmean(ordered), 3)
+    }
+
+
+def run_scale(scale: int, options: dict) -> dict:
+    """Build a corpus, ingest it and measure one scale (runs in a child process)."""
+    os.environ.update({
+        "IBM_API_KEY": "offline-benchmark",
+        "WATSONX_PROJECT_ID": "offline-benchmark",
+        "ELEVENLABS_API_KEY": "offline-benchmark",
+        "RAG_VECTOR_BACKEND": "numpy",
+        "RAG_SEMANTIC_CACHE": "0",
+        "RAG_WATCH_KB": "0",
+        "RAG_METRICS_LOG": "",
+        "TTS_CACHE_DIR": "",
+        "RAG_NARRATION_MODE": options["narration_mode"]
+    })
+    if options["workers"]:
+        os.environ["RAG_INGEST_WORKERS"] = str(options["workers"])
+
+    import embeddings
+    import voice_engine
+    from benchmarks.standins import FakeModel, FakeTTSServer, HashingEmbedder
+    from metrics import metrics
+    from narration import NarrationPipeline, split_sentences
+    from rag_engine import RAGEngine
+
+    if options["embedder"] == "hash":
+        embeddings._embedder = HashingEmbedder()
+
+    model = FakeModel(latency=options["model_latency"], first_token=options["first_token"])
+
+    class OfflineEngine(RAGEngine):
+        def _init_watsonx(self):
+            self.model = model
+
+    result = {"scale": scale}
+    with tempfile.TemporaryDirectory(prefix="teammind-bench-") as tmp:
+        kb_path = Path(tmp) / "knowledge-base"
+        files, size = write_corpus(scale, kb_path)
+        result["corpus"] = {"files": files, "mb": round(size / 1e6, 3)}
+
+        # Ingest into a fresh in-memory index
+        gc.collect()
+        rss_before = rss_bytes()
+        engine = OfflineEngine(index_dir="")
+        began = time.perf_counter()
+        engine.load_documents(str(kb_path))
+        ingest_seconds = time.perf_counter() - began
+        gc.collect()
+        stats = engine.ingest_stats.as_dict()
+        result["ingest"] = {
+            "seconds": round(ingest_seconds, 3),
+            "files_per_second": round(files / ingest_seconds, 1),
+            "mb_per_second": round(size / 1e6 / ingest_seconds, 3),
+            "chunks": len(engine.chunks),
+            "stages": {stage: round(values["seconds"], 3) for stage, values in stats["stages"].items()}
+        }
+        result["memory"] = {"index_rss_mb": round((rss_bytes() - rss_before) / 1e6, 1)}
+
+        # Retrieval latency and recall@k per mode
+        max_k = max(options["k"])
+        result["retrieval"] = {}
+        for mode in options["modes"]:
+            latencies = []
+            hits = {k: 0 for k in options["k"]}
+            for repeat in range(options["repeat"]):
+                for question, expected in LABELLED_QUESTIONS:
+                    began = time.perf_counter()
+                    chunks = engine._retrieve_relevant_chunks(question, top_k=max_k, mode=mode)
+                    latencies.append((time.perf_counter() - began) * 1000)
+                    if repeat == 0:
+                        sources = [chunk["source"] for chunk in chunks]
+                        for k in options["k"]:
+                            hits[k] += any(source in expected for source in sources[:k])
+            result["retrieval"][mode] = dict(
+                latency_ms=percentiles(latencies),
+                **{f"recall@{k}": round(hits[k] / len(LABELLED_QUESTIONS), 3) for k in options["k"]}
+            )
+
+        # End to end with the stand-in model and TTS; caches are cleared so
+        # every call does the full work
+        query_ms, first_token_ms, voice_ms = [], [], []
+        with FakeTTSServer(latency=options["tts_latency"]) as tts:
+            voice_engine.API_BASE = tts.api_base
+            voice = voice_engine.VoiceEngine()
+            for question, _ in LABELLED_QUESTIONS[:options["e2e_queries"]]:
+                engine.response_cache.clear()
+                began = time.perf_counter()
+                response = engine.query(question, CONTEXT_PREFIX)
+                query_ms.append((time.perf_counter() - began) * 1000)
+
+                script = response.get("narration") or engine.summarize_for_voice(response["answer"])
+                began_voice = time.perf_counter()
+                for _ in NarrationPipeline(iter(split_sentences(script)), voice.generate_audio):
+                    pass
+                voice_ms.append(query_ms[-1] + (time.perf_counter() - began_voice) * 1000)
+
+                engine.response_cache.clear()
+                began = time.perf_counter()
+                for event in engine.query_stream(question, CONTEXT_PREFIX):
+                    if event["type"] == "delta":
+                        first_token_ms.append((time.perf_counter() - began) * 1000)
+                        break
+        result["end_to_end"] = {
+            "query_ms": percentiles(query_ms),
+            "first_token_ms": percentiles(first_token_ms),
+            "query_and_voice_ms": percentiles(voice_ms),
+            "model_calls": model.calls,
+            "tts_requests": tts.requests
+        }
+        result["stages"] = {
+            series["labels"]["stage"]: {"p50_ms": round(series["p50"] * 1000, 3), "p95_ms": round(series["p95"] * 1000, 3),
+                                        "count": series["count"]}
+            for series in metrics.snapshot()["histograms"].get("stage_seconds", [])
+        }
+        engine.close()
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_summary(result: dict):
+    ingest = result["ingest"]
+    print(f"\nscale {result['scale']}: {result['corpus']['files']} files, {result['corpus']['mb']} MB, "
+          f"{ingest['chunks']} chunks")
+    print(f"  ingest  {ingest['seconds']:.2f}s ({ingest['mb_per_second']:.2f} MB/s), "
+          f"index memory {result['memory']['index_rss_mb']} MB")
+    for mode, values in result["retrieval"].items():
+        recall = " ".join(f"{key}={value:.2f}" for key, value in values.items() if key.startswith("recall"))
+        print(f"  {mode:<8} p50 {values['latency_ms']['p50']:.2f}ms p95 {values['latency_ms']['p95']:.2f}ms  {recall}")
+    e2e = result["end_to_end"]
+    print(f"  query p50 {e2e['query_ms']['p50']:.0f}ms, first token p50 {e2e['first_token_ms']['p50']:.0f}ms, "
+          f"query+voice p50 {e2e['query_and_voice_ms']['p50']:.0f}ms")
+
+
+def _flatten(value, prefix=""):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            yield from _flatten(item, f"{prefix}.{key}" if prefix else str(key))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        yield prefix, value
+
+
+def compare(previous: dict, current: dict):
+    """Print metrics that changed by more than 5% between two result files."""
+    before = {r["scale"]: dict(_flatten(r)) for r in previous["results"]}
+    print(f"\nChanges vs {previous['meta']['commit']} (>5%):")
+    changed = sorted(key for key in current["options"] if previous["options"].get(key) != current["options"][key])
+    if changed:
+        print(f"  (options differ: {', '.join(changed)})")
+    for result in current["results"]:
+        old = before.get(result["scale"])
+        if old is None:
+            continue
+        for key, value in _flatten(result):
+            if key in old and old[key] and abs(value - old[key]) / abs(old[key]) > 0.05:
+                print(f"  scale {result['scale']} {key}: {old[key]} -> {value} ({(value - old[key]) / abs(old[key]):+.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--modes", nargs="+", default=["vector", "lexical", "hybrid"],
+                        choices=["vector", "lexical", "hybrid"])
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--repeat", type=int, default=5, help="Retrieval passes over the question set")
+    parser.add_argument("--e2e-queries", type=int, default=len(LABELLED_QUESTIONS))
+    parser.add_argument("--model-latency", type=float, default=0.5, help="Seconds per generation")
+    parser.add_argument("--first-token", type=float, default=0.1, help="Seconds to the first streamed token")
+    parser.add_argument("--tts-latency", type=float, default=0.3, help="Seconds per TTS request")
+    parser.add_argument("--narration-mode", default="combined", choices=["combined", "extractive", "llm"])
+    parser.add_argument("--embedder", default="hash", choices=["hash", "model"],
+                        help="hash: offline stand-in; model: the real sentence-transformers model")
+    parser.add_argument("--workers", type=int, default=0, help="Ingest worker processes (0 = engine default)")
+    parser.add_argument("--output", type=Path, help="Results file (default: benchmarks/results/)")
+    parser.add_argument("--compare", type=Path, help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    options = {
+        "modes": args.modes, "k": sorted(args.k), "repeat": args.repeat, "e2e_queries": args.e2e_queries,
+        "model_latency": args.model_latency, "first_token": args.first_token, "tts_latency": args.tts_latency,
+        "narration_mode": args.narration_mode, "embedder": args.embedder, "workers": args.workers
+    }
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "options": options,
+        "results": []
+    }
+
+    context = multiprocessing.get_context("spawn")
+    for scale in args.scales:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_scale, scale, options).result()
+        report["results"].append(result)
+        print_summary(result)
+
+    output = args.output or RESULTS_DIR / f"e2e-{report['meta']['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\nSaved {output}")
+
+    if args.compare:
+        compare(json.loads(args.compare.read_text(encoding="utf-8")), report)
+
+
+if __name__ == "__main__":
+    main()
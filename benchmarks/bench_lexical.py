@@ -0,0 +1,73 @@
+"""
+Benchmark: BM25 inverted index vs the old per-query word-overlap fallback
+
+Usage:
+    python -m benchmarks.bench_lexical [--scales 1 10 100] [--queries 200]
+"""
+
+import argparse
+import statistics
+import time
+
+from benchmarks.corpus import synthetic_chunks
+from lexical_index import BM25Index
+
+QUERIES = [
+    "How do I set up my development environment?",
+    "What's the deployment process?",
+    "Who should I contact for help?",
+    "What tools does the team use?",
+    "How do I roll back a failed deployment?",
+    "What are the coding standards for Python?",
+    "Where are the database credentials configured?",
+    "How does the payment service talk to the order service?",
+]
+
+
+def legacy_search(chunks, query, top_k=3):
+    """The original fallback from RAGEngine._retrieve_relevant_chunks."""
+    query_words = set(query.lower().split())
+    scored_chunks = []
+    for chunk in chunks:
+        chunk_words = set(chunk["content"].lower().split())
+        score = len(query_words.intersection(chunk_words))
+        scored_chunks.append((score, chunk))
+    scored_chunks.sort(key=lambda x: x[0], reverse=True)
+    return [chunk for _, chunk in scored_chunks[:top_k]]
+
+
+def time_queries(search, n_queries):
+    latencies = []
+    for i in range(n_queries):
+        query = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        search(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'scale':>6} {'chunks':>8} {'build ms':>9} {'legacy p50':>11} {'legacy p95':>11} "
+          f"{'bm25 p50':>9} {'bm25 p95':>9} {'speedup':>8}")
+    for scale in args.scales:
+        chunks = synthetic_chunks(scale)
+
+        start = time.perf_counter()
+        index = BM25Index(chunks)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        legacy_p50, legacy_p95 = time_queries(lambda q: legacy_search(chunks, q), args.queries)
+        bm25_p50, bm25_p95 = time_queries(lambda q: index.search(q, 3), args.queries)
+
+        print(f"{scale:>6} {len(chunks):>8} {build_ms:>9.1f} {legacy_p50:>9.3f}ms {legacy_p95:>9.3f}ms "
+              f"{bm25_p50:>7.3f}ms {bm25_p95:>7.3f}ms {legacy_p50 / bm25_p50:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
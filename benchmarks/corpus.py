@@ -0,0 +1,70 @@
+"""
+Synthetic corpora for benchmarks, built by replicating knowledge-base/
+"""
+
+import random
+from pathlib import Path
+from typing import List, Tuple
+
+KB_PATH = Path(__file__).resolve().parent.parent / "knowledge-base"
+
+
+def load_sections(kb_path: Path = KB_PATH) -> List[str]:
+    """Return every "## " section of every markdown file in the knowledge base."""
+    sections = []
+    for md_file in sorted(kb_path.rglob("*.md")):
+        for i, section in enumerate(md_file.read_text(encoding="utf-8").split("\n## ")):
+            section = section if i == 0 else "## " + section
+            if section.strip():
+                sections.append(section.strip())
+    return sections
+
+
+def synthetic_chunks(scale: int, seed: int = 0) -> List[dict]:
+    """Return `scale` copies of the knowledge base sections as chunk dicts.
+
+    Each copy gets a few unique service names mixed in so copies are not
+    byte-identical and rare terms exist, like in a real corpus.
+    """
+    rng = random.Random(seed)
+    sections = load_sections()
+    chunks = []
+    for copy in range(scale):
+        for i, section in enumerate(sections):
+            words = section.split()
+            for _ in range(3):
+                words.insert(rng.randrange(len(words) + 1), f"svc-{copy}-{rng.randrange(1000)}")
+            chunks.append({
+                "id": f"{copy}-{i}",
+                "source": f"copy-{copy}/section-{i}.md",
+                "content": " ".join(words)
+            })
+    return chunks
+
+
+def write_corpus(scale: int, dest: Path, seed: int = 0) -> Tuple[int, int]:
+    """Write `scale` copies of the knowledge base under dest/copy-<n>/.
+
+    Every "## " heading gets an owner line with a unique service name, so
+    copies differ like real documents do while keeping their structure.
+
+    Returns:
+        tuple: (files written, bytes written)
+    """
+    rng = random.Random(seed)
+    sources = [(path.relative_to(KB_PATH), path.read_text(encoding="utf-8")) for path in sorted(KB_PATH.rglob("*.md"))]
+    files = size = 0
+    for copy in range(scale):
+        for relpath, text in sources:
+            lines = []
+            for line in text.split("\n"):
+                lines.append(line)
+                if line.startswith("## "):
+                    lines.append(f"Owner: svc-{copy}-{rng.randrange(1000)}")
+            target = dest / f"copy-{copy}" / relpath
+            target.parent.mkdir(parents=True, exist_ok=True)
+            content = "\n".join(lines)
+            target.write_text(content, encoding="utf-8")
+            files += 1
+            size += len(content.encode("utf-8"))
+    return files, size
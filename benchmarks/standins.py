@@ -0,0 +1,142 @@
+"""
+Offline stand-ins for the external services, for benchmarks
+
+- FakeModel: replaces ibm_watsonx_ai ModelInference (generate_text and
+  generate_text_stream) with deterministic output and simulated latency
+- FakeTTSServer: a local HTTP server that answers the ElevenLabs
+  text-to-speech endpoints the way VoiceEngine expects
+- HashingEmbedder: a deterministic bag-of-words embedder, so the vector
+  and hybrid retrieval modes run without downloading a model
+
+Output depends only on the input, so runs are repeatable across commits.
+"""
+
+import hashlib
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List
+
+import numpy as np
+
+from lexical_index import tokenize
+from narration import split_sentences
+
+_CONTEXT = re.compile(r"CONTEXT:\n(.*?)\n\nUSER QUESTION:", re.DOTALL)
+_SOURCE_LINE = re.compile(r"^\[From [^\]]*\]:$", re.MULTILINE)
+
+
+class FakeModel:
+    """Deterministic ModelInference stand-in.
+
+    Answers with the first sentences of the prompt's context (or says the
+    answer can't be found when there is none), in the combined
+    <answer>/<narration> format when the prompt asks for it.
+    """
+
+    def __init__(self, latency: float = 0.5, first_token: float = 0.1, stream_parts: int = 8):
+        """
+        Args:
+            latency: Seconds for a whole generation.
+            first_token: Seconds before the first streamed part (part of `latency`).
+            stream_parts: Parts a streamed response is split into.
+        """
+        self.latency = latency
+        self.first_token = min(first_token, latency)
+        self.stream_parts = max(1, stream_parts)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _respond(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+        if prompt.rstrip().endswith("AUDIO SCRIPT:"):
+            text = prompt.split("TEXT:", 1)[-1]
+            return " ".join(split_sentences(text.replace("AUDIO SCRIPT:", ""))[:2]) or "Here you go."
+
+        match = _CONTEXT.search(prompt)
+        context = _SOURCE_LINE.sub("", match.group(1)).strip() if match else ""
+        sentences = split_sentences(" ".join(context.split()))
+        answer = " ".join(sentences[:3]) if sentences else "I cannot find this in the documents."
+        if prompt.endswith("<answer>\n"):
+            narration = sentences[0] if sentences else "Sorry, I couldn't find that one."
+            return f"{answer}\n</answer>\n<narration>\n{narration}\n</narration>"
+        return " " + answer
+
+    def generate_text(self, prompt: str, **kwargs) -> str:
+        time.sleep(self.latency)
+        return self._respond(prompt)
+
+    def generate_text_stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        text = self._respond(prompt)
+        time.sleep(self.first_token)
+        step = max(1, -(-len(text) // self.stream_parts))
+        parts = [text[i:i + step] for i in range(0, len(text), step)]
+        pause = (self.latency - self.first_token) / max(1, len(parts) - 1)
+        for i, part in enumerate(parts):
+            if i:
+                time.sleep(pause)
+            yield part
+
+
+class FakeTTSServer:
+    """Local HTTP server for POST {base}/{voice_id}[/stream], returning fake MP3 bytes.
+
+    Use as a context manager; point voice_engine.API_BASE at `api_base`.
+    """
+
+    def __init__(self, latency: float = 0.3, bytes_per_char: int = 80):
+        self.latency = latency
+        self.bytes_per_char = bytes_per_char
+        self.requests = 0
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", "0"))
+                body = self.rfile.read(length)
+                server.requests += 1
+                time.sleep(server.latency)
+                # Size tracks the text, like real speech; content is a digest of it
+                digest = hashlib.sha256(body).digest()
+                audio = b"ID3" + digest * max(1, len(body) * server.bytes_per_char // len(digest))
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Content-Length", str(len(audio)))
+                self.end_headers()
+                self.wfile.write(audio)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self.api_base = f"http://127.0.0.1:{self._server.server_address[1]}/v1/text-to-speech"
+
+    def __enter__(self) -> "FakeTTSServer":
+        threading.Thread(target=self._server.serve_forever, name="fake-tts", daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class HashingEmbedder:
+    """Embedder stand-in: signed feature hashing of stemmed tokens, L2-normalised."""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self.model_name = f"hashing-{dimension}"
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                code = zlib.crc32(token.encode("utf-8"))
+                matrix[row, code % self.dimension] += 1.0 if code & 0x80000000 else -1.0
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
@@ -0,0 +1,136 @@
+"""
+Chunker - Token-sized, heading-aware markdown chunks, produced lazily
+
+The original chunker split on "## ", counted characters per word and, every
+time a chunk filled, re-summed the whole overlap window. This one:
+
+- measures chunks in model tokens (tiktoken, or the estimate from
+  context_packer), encoding each section once and locating every word
+  boundary among its token offsets
+- finds cut and overlap points by bisecting the resulting prefix sums
+  instead of re-summing the overlap window
+- records the heading path ("Guide > Setup > Docker") a chunk starts under
+- yields chunks one section at a time
+
+Sections start at headings of level <= split_level (## by default), like the
+original, and whitespace inside a chunk is preserved. Headings inside fenced
+code blocks are ignored.
+"""
+
+import re
+from bisect import bisect_left
+from typing import Iterator, List
+
+from context_packer import running_tokens
+
+DEFAULT_CHUNK_TOKENS = 128
+DEFAULT_OVERLAP_TOKENS = 24
+# Bump when the same settings would cut chunks differently, so saved chunks are redone
+CHUNKER_VERSION = 2
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_FENCE = re.compile(r"[ \t]*(?:```|~~~)")
+# Cheap scan for lines that could be a heading or a code fence
+_CANDIDATE = re.compile(r"\n(?:#|[ \t]*(?:```|~~~))")
+# A word together with the whitespace around it, so joining pieces restores the text
+_PIECE = re.compile(r"\S+\s*")
+
+
+def _section_chunks(text: str, events: List[tuple], headings: List[tuple], source: str,
+                    chunk_tokens: int, overlap_tokens: int) -> Iterator[dict]:
+    """Chunk one section; `events` are (offset, level, title) headings inside it."""
+    stripped = text.strip()
+    if not stripped:
+        for _, level, title in events:
+            _push_heading(headings, level, title)
+        return
+    # Splitting on single spaces keeps newlines and indentation inside the
+    # pieces, so " ".join() of any run of pieces restores the original text
+    pieces = stripped.split(" ")
+    n = len(pieces)
+    # Prefix sums: the tokens before pieces[i] are cum[i], from one encoding of the section
+    cum = running_tokens(pieces)
+    # Index of the piece each heading falls in
+    lead = len(text) - len(text.lstrip())
+    event_pieces = [stripped.count(" ", 0, max(0, offset - lead)) for offset, _, _ in events]
+
+    start = fresh = 0
+    next_event = 0
+    while fresh < n:
+        # Headings in effect where this chunk's new text begins
+        while next_event < len(events) and event_pieces[next_event] <= fresh:
+            _push_heading(headings, events[next_event][1], events[next_event][2])
+            next_event += 1
+
+        # Cut once the window reaches chunk_tokens
+        end = min(bisect_left(cum, cum[start] + chunk_tokens, fresh + 1), n)
+        yield {
+            "source": source,
+            "content": " ".join(pieces[start:end]).strip(),
+            "headings": " > ".join(title for _, title in headings),
+            "tokens": cum[end] - cum[start]
+        }
+        # Carry at most overlap_tokens of trailing text into the next chunk
+        start = max(bisect_left(cum, cum[end] - overlap_tokens, start + 1), start + 1)
+        fresh = end
+
+    for _, level, title in events[next_event:]:
+        _push_heading(headings, level, title)
+
+
+def _push_heading(headings: List[tuple], level: int, title: str):
+    while headings and headings[-1][0] >= level:
+        headings.pop()
+    headings.append((level, title))
+
+
+def iter_chunks(text: str, source: str,
+                chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+                overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+                split_level: int = 2) -> Iterator[dict]:
+    """Yield {"source", "content", "headings", "tokens"} chunks for one document.
+
+    Args:
+        text: The document.
+        source: Value for each chunk's "source" field.
+        chunk_tokens: Target chunk size; a chunk is cut once it reaches it.
+        overlap_tokens: Trailing tokens repeated at the start of the next chunk.
+        split_level: Headings at this level or above always start a new chunk.
+
+    Chunks are yielded one section at a time.
+    """
+    if overlap_tokens >= chunk_tokens:
+        raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+
+    headings: List[tuple] = []   # (level, title) stack
+    for section, events in _split_text(text, split_level):
+        yield from _section_chunks(section, events, headings, source, chunk_tokens, overlap_tokens)
+
+
+def _split_text(text: str, split_level: int) -> Iterator[tuple]:
+    """Yield (section text, heading events) for a whole document."""
+    start = 0
+    events: List[tuple] = []
+    in_fence = False
+    # Line starts that need a closer look (the first line is always checked)
+    line_starts = [m.start() + 1 for m in _CANDIDATE.finditer(text)]
+    if text.startswith("#") or _FENCE.match(text):
+        line_starts.insert(0, 0)
+    for line_start in line_starts:
+        if _FENCE.match(text, line_start):
+            in_fence = not in_fence
+            continue
+        if in_fence or text[line_start] != "#":
+            continue
+        line_end = text.find("\n", line_start)
+        heading = _HEADING.match(text[line_start:line_end if line_end != -1 else len(text)])
+        if not heading:
+            continue
+        level = len(heading.group(1))
+        if level <= split_level and line_start > start:
+            yield text[start:line_start], events
+            start, events = line_start, []
+        events.append((line_start - start, level, heading.group(2)))
+    if start < len(text):
+        yield text[start:], events
+
@@ -0,0 +1,231 @@
+"""
+Context Packer - Fit retrieved chunks into a token budget without repeats
+
+Adjacent chunks of a section share up to 24 tokens of overlap, so sending the
+top-k chunks verbatim often repeats the same text. The packer walks chunks in
+score order, merges chunks from the same source whose text overlaps into one
+span, and stops adding (or truncates the last addition) once the context
+token budget is spent.
+
+Tokens are counted with tiktoken when it is installed; otherwise a
+word/punctuation estimate is used, which is close enough for budgeting.
+"""
+
+import re
+from bisect import bisect_left
+from functools import partial
+from itertools import accumulate, count
+from operator import add
+from typing import Dict, List, Optional, Tuple
+
+_WORD = re.compile(r"\w+|[^\w\s]")
+# Words long enough to be estimated as more than one token
+_LONG_WORD = re.compile(r"\w{8,}")
+_PIECE = re.compile(r"\S+\s*")
+
+# Overlap shorter than this is treated as coincidence, not chunk overlap
+MIN_OVERLAP_WORDS = 5
+
+
+def _load_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # Not installed, or the encoding file can't be fetched offline
+        return None
+
+
+_encoding = _load_encoding()
+# What count_tokens() measures with, for reports
+TOKEN_COUNTER = "tiktoken cl100k_base" if _encoding is not None else "word/punctuation estimate"
+# Bytes per token id, filled in as tokens are seen
+_token_bytes: Dict[int, int] = {}
+# Estimated tokens per distinct text slice; natural-language vocabularies are small
+_estimates: Dict[str, int] = {}
+_ESTIMATES_SIZE = 1 << 17
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text (tiktoken cl100k_base, or an estimate)."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    # Roughly one token per word or punctuation mark, plus one per 4 chars of long words
+    return len(_WORD.findall(text)) + sum((len(word) - 4) // 4 for word in _LONG_WORD.findall(text))
+
+
+def running_tokens(pieces: List[str], sep: str = " ") -> List[int]:
+    """Tokens of sep.join(pieces) before each piece, then the total (len(pieces) + 1 values).
+
+    With tiktoken the joined text is encoded once and every piece boundary
+    is located among the token offsets; a token that starts on a separator
+    (BPE tokens carry their leading space) counts towards the next piece.
+    The estimate is per word, so it is summed over the pieces instead,
+    memoised per distinct piece.
+    """
+    if _encoding is None:
+        try:
+            # Usual case: every piece has been seen before
+            return list(accumulate(map(_estimates.__getitem__, pieces), initial=0))
+        except KeyError:
+            pass
+        if len(_estimates) >= _ESTIMATES_SIZE:
+            _estimates.clear()
+        for piece in pieces:
+            if piece not in _estimates:
+                _estimates[piece] = count_tokens(piece)
+        return list(accumulate(map(_estimates.__getitem__, pieces), initial=0))
+
+    text = sep.join(pieces)
+    tokens = _encoding.encode(text, disallowed_special=())
+    sizes = list(map(_token_bytes.get, tokens))
+    if None in sizes:
+        for i, size in enumerate(sizes):
+            if size is None:
+                sizes[i] = _token_bytes[tokens[i]] = len(_encoding.decode_single_token_bytes(tokens[i]))
+    # Offsets are in UTF-8 bytes: where each token starts, and each separator
+    starts = list(accumulate(sizes[:-1], initial=0))
+    lengths = map(len, pieces[:-1]) if text.isascii() else map(len, map(str.encode, pieces[:-1]))
+    separators = map(add, accumulate(lengths), count(0, len(sep.encode("utf-8"))))
+    return [0, *map(partial(bisect_left, starts), separators), len(tokens)]
+
+
+def _overlap(left: List[str], right: List[str], max_words: int) -> int:
+    """Length of the longest suffix of left that is also a prefix of right."""
+    for size in range(min(len(left), len(right), max_words), MIN_OVERLAP_WORDS - 1, -1):
+        if left[-size:] == right[:size]:
+            return size
+    return 0
+
+
+def _pieces(text: str) -> List[str]:
+    """Words with their trailing whitespace: "".join() restores the text, line breaks included."""
+    return _PIECE.findall(text.strip())
+
+
+class _Span:
+    """Contiguous text from one source, built from one or more chunks."""
+
+    def __init__(self, chunk: dict):
+        self.source = chunk["source"]
+        self.pieces = _pieces(chunk["content"])
+        self.words = [piece.rstrip() for piece in self.pieces]
+        self.ids = [chunk.get("id")]
+
+    def absorb(self, chunk: dict, max_overlap: int) -> Optional[List[str]]:
+        """Merge an overlapping chunk; return the words it added, or None if it doesn't touch."""
+        pieces = _pieces(chunk["content"])
+        words = [piece.rstrip() for piece in pieces]
+        # Whole words only: "log" is not contained in "catalog"
+        if f" {' '.join(words)} " in f" {' '.join(self.words)} ":
+            self.ids.append(chunk.get("id"))
+            return []
+
+        # The chunk's own pieces carry the whitespace of the overlapping text
+        after = _overlap(self.words, words, max_overlap)
+        if after:
+            self.pieces = self.pieces[:-after] + pieces
+            self.words = self.words[:-after] + words
+            self.ids.append(chunk.get("id"))
+            return words[after:]
+
+        before = _overlap(words, self.words, max_overlap)
+        if before:
+            self.pieces = pieces + self.pieces[before:]
+            self.words = words + self.words[before:]
+            self.ids.insert(0, chunk.get("id"))
+            return words[:-before]
+        return None
+
+    @property
+    def content(self) -> str:
+        return "".join(self.pieces)
+
+
+class ContextPacker:
+    """Packs ranked chunks into a deduplicated, token-budgeted context."""
+
+    def __init__(self, budget_tokens: int = 1500, max_overlap_words: int = 100):
+        """
+        Args:
+            budget_tokens: Tokens allowed for the context block; 0 disables the limit.
+            max_overlap_words: Longest overlap looked for between two chunks.
+        """
+        self.budget_tokens = budget_tokens
+        self.max_overlap_words = max_overlap_words
+
+    def pack(self, chunks: List[dict]) -> Tuple[List[dict], dict]:
+        """Pack chunks (best first) into context sections.
+
+        Returns:
+            (sections, stats): sections are {"source", "content", "ids"} dicts
+            in the order they should appear in the prompt; stats reports the
+            tokens used and how many chunks were merged, truncated or dropped.
+        """
+        spans: List[_Span] = []
+        used = 0
+        stats = {"chunks": len(chunks), "merged": 0, "truncated": 0, "dropped": 0,
+                 "duplicate_tokens": 0, "context_tokens": 0}
+        budget = self.budget_tokens or float("inf")
+
+        for chunk in chunks:
+            full_cost = count_tokens(chunk["content"])
+            if used >= budget:
+                stats["dropped"] += 1
+                continue
+
+            merged = False
+            for span in spans:
+                if span.source != chunk["source"]:
+                    continue
+                before = span.pieces, span.words
+                added = span.absorb(chunk, self.max_overlap_words)
+                if added is None:
+                    continue
+                cost = count_tokens(" ".join(added))
+                if used + cost > budget:
+                    # Undo: the new part doesn't fit
+                    span.pieces, span.words = before
+                    span.ids.remove(chunk.get("id"))
+                    stats["dropped"] += 1
+                else:
+                    used += cost
+                    stats["merged"] += 1
+                    stats["duplicate_tokens"] += max(0, full_cost - cost)
+                merged = True
+                break
+            if merged:
+                continue
+
+            if used + full_cost > budget:
+                # Keep the head of the chunk that still fits
+                remaining = budget - used
+                pieces = _pieces(chunk["content"])
+                keep = self._fit_words(pieces, remaining)
+                if keep < MIN_OVERLAP_WORDS:
+                    stats["dropped"] += 1
+                    continue
+                chunk = dict(chunk, content="".join(pieces[:keep]).rstrip() + " ...")
+                full_cost = count_tokens(chunk["content"])
+                stats["truncated"] += 1
+
+            spans.append(_Span(chunk))
+            used += full_cost
+
+        stats["context_tokens"] = used
+        sections = [{"source": span.source, "content": span.content, "ids": span.ids} for span in spans]
+        return sections, stats
+
+    @staticmethod
+    def _fit_words(pieces: List[str], budget: float) -> int:
+        """Largest word count whose truncated text fits the budget (binary search)."""
+        low, high = 0, len(pieces)
+        while low < high:
+            mid = (low + high + 1) // 2
+            if count_tokens("".join(pieces[:mid]).rstrip() + " ...") <= budget:
+                low = mid
+            else:
+                high = mid - 1
+        return low
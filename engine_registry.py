@@ -0,0 +1,161 @@
+"""
+Engine Registry - One shared RAGEngine per knowledge base, per process
+
+Streamlit re-runs app.py for every browser session, but imported modules are
+cached, so state kept here is shared by every session in the server process.
+
+Lifecycle:
+1. The first call to get_engine() for a knowledge base builds the engine
+   (watsonx client + index) once. Concurrent callers block on the same build
+   instead of starting their own.
+2. Every later call returns the same engine. Sessions treat it as read-only;
+   per-session state lives only in st.session_state (chat history, mode).
+3. reload_engine() builds a fresh engine off to the side and swaps it in with
+   a single assignment. Sessions that already hold the old engine finish their
+   current query against it. The old engine is retired and only closed on the
+   *next* reload, which gives in-flight queries a full reload period to drain.
+4. While an engine is registered, a KnowledgeBaseWatcher applies doc edits to
+   it incrementally via RAGEngine.refresh() (set RAG_WATCH_KB=0 to disable).
+   Refreshes and reloads are serialized per knowledge base.
+5. Whenever an engine is built, reloaded or its index changes, a Warmer
+   pre-computes answers, narration and audio for the quick topics in the
+   background (see warmup.py; set RAG_WARMUP=0 to disable).
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+from kb_watcher import KnowledgeBaseWatcher
+from rag_engine import RAGEngine
+from warmup import Warmer
+
+
+class EngineRegistry:
+    """Thread-safe, process-wide registry of loaded RAG engines."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._engines: Dict[str, RAGEngine] = {}
+        self._retired: Dict[str, RAGEngine] = {}
+        self._watchers: Dict[str, KnowledgeBaseWatcher] = {}
+        self._warmers: Dict[str, Warmer] = {}
+
+    @staticmethod
+    def _key(knowledge_base_path: str) -> str:
+        return str(Path(knowledge_base_path).resolve())
+
+    def _build_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            if key not in self._build_locks:
+                self._build_locks[key] = threading.Lock()
+            return self._build_locks[key]
+
+    @staticmethod
+    def _build(knowledge_base_path: str) -> RAGEngine:
+        engine = RAGEngine()
+        engine.load_documents(knowledge_base_path)
+        return engine
+
+    def is_loaded(self, knowledge_base_path: str) -> bool:
+        """Return True if an engine for this knowledge base is ready."""
+        return self._key(knowledge_base_path) in self._engines
+
+    def peek(self, knowledge_base_path: str) -> Optional[RAGEngine]:
+        """Return the current engine without building one."""
+        return self._engines.get(self._key(knowledge_base_path))
+
+    def get_engine(self, knowledge_base_path: str) -> RAGEngine:
+        """Return the shared engine, building it on first use."""
+        key = self._key(knowledge_base_path)
+        engine = self._engines.get(key)
+        if engine is not None:
+            return engine
+
+        with self._build_lock(key):
+            # Another thread may have finished the build while we waited
+            engine = self._engines.get(key)
+            if engine is None:
+                engine = self._build(knowledge_base_path)
+                with self._lock:
+                    self._engines[key] = engine
+                self._start_watcher(knowledge_base_path)
+                self._warm(key, engine)
+        return engine
+
+    def reload_engine(self, knowledge_base_path: str) -> RAGEngine:
+        """Build a fresh engine and atomically swap it in for all sessions."""
+        key = self._key(knowledge_base_path)
+        with self._build_lock(key):
+            engine = self._build(knowledge_base_path)
+            with self._lock:
+                previous = self._engines.get(key)
+                stale = self._retired.pop(key, None)
+                self._engines[key] = engine
+                if previous is not None:
+                    self._retired[key] = previous
+
+        self._warm(key, engine)
+        if stale is not None:
+            stale.close()
+        return engine
+
+    def refresh(self, knowledge_base_path: str, changed_paths=None) -> bool:
+        """Apply changed files to the current engine's live index."""
+        key = self._key(knowledge_base_path)
+        with self._build_lock(key):
+            engine = self._engines.get(key)
+            if engine is None:
+                return False
+            changed = engine.refresh(changed_paths)
+        if changed:
+            self._warm(key, engine)
+        return changed
+    
+    def warmer(self, knowledge_base_path: str) -> Optional[Warmer]:
+        """The quick-topic warmer for a knowledge base (None if warm-up is off or not started)."""
+        return self._warmers.get(self._key(knowledge_base_path))
+    
+    def _warm(self, key: str, engine: RAGEngine):
+        if os.getenv("RAG_WARMUP", "1") == "0":
+            return
+        with self._lock:
+            warmer = self._warmers.get(key)
+            if warmer is None:
+                warmer = self._warmers[key] = Warmer()
+        warmer.schedule(engine)
+
+    def _start_watcher(self, knowledge_base_path: str):
+        key = self._key(knowledge_base_path)
+        if os.getenv("RAG_WATCH_KB", "1") == "0" or key in self._watchers:
+            return
+        if not Path(knowledge_base_path).exists():
+            return
+        watcher = KnowledgeBaseWatcher(
+            knowledge_base_path,
+            on_change=lambda paths: self.refresh(knowledge_base_path, paths)
+        )
+        watcher.start()
+        self._watchers[key] = watcher
+
+    def stop_watchers(self):
+        """Stop every knowledge base watcher (used on shutdown)."""
+        for watcher in list(self._watchers.values()):
+            watcher.stop()
+        self._watchers.clear()
+
+
+# Default process-wide registry used by the Streamlit app
+registry = EngineRegistry()
+
+
+def get_engine(knowledge_base_path: str = "knowledge-base") -> RAGEngine:
+    """Return the process-wide shared engine for a knowledge base."""
+    return registry.get_engine(knowledge_base_path)
+
+
+def reload_engine(knowledge_base_path: str = "knowledge-base") -> RAGEngine:
+    """Rebuild the shared engine for a knowledge base and swap it in."""
+    return registry.reload_engine(knowledge_base_path)
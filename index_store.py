@@ -0,0 +1,314 @@
+"""
+Index Store - Persistent manifest for incremental knowledge base indexing
+
+The index directory holds:
+- index.db: a SQLite file with, for every markdown file, its content hash,
+  size/mtime and the chunks (ids + text) it produced, plus the BM25 postings
+  of those chunks
+- chroma/: the persistent ChromaDB collection with the chunk embeddings
+
+On startup the manifest is compared with the files on disk. Files whose
+size and mtime are unchanged are trusted without being read; everything
+else is hashed, and only files whose hash actually changed are re-chunked
+and re-embedded. The BM25 index is loaded as saved and patched for those
+files only, so a restart with nothing changed costs about a manifest read.
+
+Writes are per file: an update rewrites the rows of the files it changed
+and the postings of the terms their chunks contain, in one transaction, so
+the manifest and the postings always match each other.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+from collections import Counter
+from contextlib import closing, contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Union
+
+from lexical_index import LEXICAL_FORMAT, BM25Index
+
+MANIFEST_VERSION = 2
+
+
+def file_hash(path: Union[str, Path], block_size: int = 1 << 20) -> str:
+    """Return the hex SHA-256 of a file's bytes, read block by block."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_id(relpath: str, index: int, content: str) -> str:
+    """Return a stable id for a chunk; it changes whenever the chunk text does."""
+    digest = hashlib.sha1(f"{relpath}\0{index}\0{content}".encode("utf-8"))
+    return digest.hexdigest()[:20]
+
+
+def changed_files(previous: Dict[str, dict], current: Dict[str, dict]) -> List[str]:
+    """Relative paths whose entry was added, removed or replaced."""
+    return sorted(
+        relpath for relpath in previous.keys() | current.keys()
+        if previous.get(relpath) is not current.get(relpath)
+    )
+
+
+class IndexStore:
+    """Reads and incrementally writes the on-disk index manifest."""
+
+    def __init__(self, index_dir: str, chunking: Optional[dict] = None):
+        """
+        Args:
+            index_dir: Directory holding the manifest and vector store.
+            chunking: Chunker settings; a manifest written with different
+                settings is discarded so every file is re-chunked.
+        """
+        self.index_dir = Path(index_dir)
+        self.db_path = self.index_dir / "index.db"
+        # Written by earlier versions; read once and replaced by index.db
+        self.legacy_path = self.index_dir / "manifest.json"
+        self.chunking = chunking or {}
+
+        # Whether index.db holds exactly what was last loaded or saved, so
+        # the next save may write only the difference
+        self._synced = False
+        self._lexical_generation: Optional[int] = None
+
+    @property
+    def chroma_path(self) -> str:
+        return str(self.index_dir / "chroma")
+
+    @contextmanager
+    def _connect(self):
+        """A connection for one transaction (committed on success)."""
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(self.db_path, timeout=30)) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+                conn.execute("CREATE TABLE IF NOT EXISTS files (relpath TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS lexical_docs ("
+                    " slot INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL, length INTEGER NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS lexical_terms ("
+                    " term TEXT PRIMARY KEY, slots BLOB NOT NULL, tfs BLOB NOT NULL)"
+                )
+                yield conn
+
+    def _meta(self, conn: sqlite3.Connection) -> Dict[str, object]:
+        return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+
+    def load(self) -> Dict[str, dict]:
+        """Return the stored file entries keyed by relative path ({} if none)."""
+        self._synced = False
+        self._lexical_generation = None
+        if not self.db_path.exists() and self.legacy_path.exists():
+            return self._load_legacy()
+        try:
+            with self._connect() as conn:
+                meta = self._meta(conn)
+                if meta.get("version") != MANIFEST_VERSION or meta.get("chunking", {}) != self.chunking:
+                    return {}
+                files = {relpath: json.loads(entry) for relpath, entry in conn.execute("SELECT relpath, entry FROM files")}
+        except (sqlite3.Error, ValueError):
+            # A corrupt manifest just means a full rebuild
+            return {}
+        self._synced = True
+        return files
+
+    def _load_legacy(self) -> Dict[str, dict]:
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("version") != 1 or manifest.get("chunking", {}) != self.chunking:
+            return {}
+        return manifest.get("files", {})
+
+    def load_lexical(self, k1: float = 1.5, b: float = 0.75) -> Optional[BM25Index]:
+        """Return the saved BM25 index, or None if there is none (or it is outdated)."""
+        if not self._synced:
+            return None
+        try:
+            with self._connect() as conn:
+                if self._meta(conn).get("lexical") != {"format": LEXICAL_FORMAT, "k1": k1, "b": b}:
+                    return None
+                index = BM25Index.restore(
+                    conn.execute("SELECT slot, chunk_id, length FROM lexical_docs"),
+                    conn.execute("SELECT term, slots, tfs FROM lexical_terms"),
+                    k1=k1, b=b
+                )
+        except (sqlite3.Error, ValueError):
+            return None
+        self._lexical_generation = index.generation
+        return index
+
+    def save(self, files: Dict[str, dict], changed: Optional[Iterable[str]] = None,
+             lexical: Optional[BM25Index] = None):
+        """Write the manifest, and the BM25 postings if given, in one transaction.
+
+        Args:
+            files: Every file entry, keyed by relative path.
+            changed: Paths whose entry changed since the last load/save; only
+                those rows are written. None rewrites everything.
+            lexical: BM25 index of `files`. Only the terms and chunks it
+                changed are written when it was derived from the saved one.
+        """
+        full = changed is None or not self._synced
+        try:
+            with self._connect() as conn:
+                if full:
+                    conn.execute("DELETE FROM files")
+                    conn.executemany(
+                        "INSERT INTO files (relpath, entry) VALUES (?, ?)",
+                        ((relpath, self._dump(entry)) for relpath, entry in files.items())
+                    )
+                    conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                        ("version", json.dumps(MANIFEST_VERSION)),
+                        ("chunking", json.dumps(self.chunking))
+                    ])
+                else:
+                    for relpath in changed:
+                        entry = files.get(relpath)
+                        if entry is None:
+                            conn.execute("DELETE FROM files WHERE relpath = ?", (relpath,))
+                        else:
+                            conn.execute("INSERT OR REPLACE INTO files (relpath, entry) VALUES (?, ?)",
+                                         (relpath, self._dump(entry)))
+                if lexical is not None:
+                    self._save_lexical(conn, lexical, full)
+        except BaseException:
+            # What is on disk no longer matches what we hold in memory
+            self._synced = False
+            self._lexical_generation = None
+            raise
+        self._synced = True
+        if lexical is not None:
+            self._lexical_generation = lexical.generation
+        if self.legacy_path.exists():
+            try:
+                os.unlink(self.legacy_path)
+            except OSError:
+                pass
+
+    def _save_lexical(self, conn: sqlite3.Connection, lexical: BM25Index, full: bool):
+        if not full and lexical.generation == self._lexical_generation:
+            return
+        if full or lexical.base_generation is None or lexical.base_generation != self._lexical_generation:
+            conn.execute("DELETE FROM lexical_docs")
+            conn.execute("DELETE FROM lexical_terms")
+            slots, terms = None, None
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (
+                "lexical", json.dumps({"format": LEXICAL_FORMAT, "k1": lexical.k1, "b": lexical.b})
+            ))
+        else:
+            slots, terms = sorted(lexical.changed_slots), sorted(lexical.changed_terms)
+
+        for slot, cid, length in lexical.doc_rows(slots):
+            if cid is None:
+                conn.execute("DELETE FROM lexical_docs WHERE slot = ?", (slot,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO lexical_docs (slot, chunk_id, length) VALUES (?, ?, ?)",
+                             (slot, cid, length))
+        for term, slot_bytes, tf_bytes in lexical.term_rows(terms):
+            if slot_bytes is None:
+                conn.execute("DELETE FROM lexical_terms WHERE term = ?", (term,))
+            else:
+                conn.execute("INSERT OR REPLACE INTO lexical_terms (term, slots, tfs) VALUES (?, ?, ?)",
+                             (term, slot_bytes, tf_bytes))
+
+    @staticmethod
+    def _dump(entry: dict) -> str:
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+    @staticmethod
+    def chunk_ids(files: Dict[str, dict]) -> List[str]:
+        """Return every chunk id referenced by a set of file entries."""
+        return [chunk["id"] for entry in files.values() for chunk in entry.get("chunks", [])]
+
+
+class IndexSnapshot:
+    """Immutable view of the indexed knowledge base that queries read from.
+
+    Updates build a new snapshot and swap the engine's reference in a single
+    assignment, so a query always sees either the whole old index or the
+    whole new one, never a mix.
+    """
+
+    def __init__(self, kb_path: Path = None, files: Dict[str, dict] = None, version: int = 0,
+                 lexical: Optional[BM25Index] = None):
+        self.kb_path = kb_path
+        self.files = files or {}
+        self.version = version
+        self._document_of = {relpath: self._document(relpath, entry) for relpath, entry in self.files.items()}
+        self.documents = [document for document in self._document_of.values() if document]
+        self.chunks = [chunk for entry in self.files.values() for chunk in entry.get("chunks", [])]
+        self.by_id = {chunk["id"]: chunk for chunk in self.chunks}
+        # Chunks per distinct "Document > Section" heading path
+        self._topics = Counter(filter(None, map(self._topic, self.chunks)))
+        # BM25 postings are built once, then patched per update; never per query
+        if lexical is None or not lexical.matches(self.by_id):
+            lexical = BM25Index(self.chunks)
+        self.lexical = lexical
+
+    @property
+    def topics(self) -> int:
+        return len(self._topics)
+
+    @staticmethod
+    def _topic(chunk: dict) -> str:
+        return " > ".join(chunk["headings"].split(" > ", 2)[:2]) if chunk.get("headings") else ""
+
+    def _document(self, relpath: str, entry: dict) -> Optional[dict]:
+        if entry.get("rejected"):
+            return None
+        # os.path rather than pathlib: this runs for every file at startup
+        return {"path": os.path.normpath(os.path.join(self.kb_path or ".", relpath)), "filename": entry["filename"]}
+
+    def updated(self, files: Dict[str, dict], version: int) -> "IndexSnapshot":
+        """A snapshot of `files`, built from this one.
+
+        Only files whose entry changed are looked at: their old chunks are
+        dropped from the chunk map and BM25 postings and their new ones added.
+        """
+        changed = set(changed_files(self.files, files))
+        removed: List[dict] = []
+        added: List[dict] = []
+        for relpath in changed:
+            old = self.files.get(relpath, {}).get("chunks", [])
+            new = files.get(relpath, {}).get("chunks", [])
+            if old is new:
+                continue
+            old_ids = {chunk["id"] for chunk in old}
+            new_ids = {chunk["id"] for chunk in new}
+            removed.extend(chunk for chunk in old if chunk["id"] not in new_ids)
+            added.extend(chunk for chunk in new if chunk["id"] not in old_ids)
+
+        snapshot = copy.copy(self)
+        snapshot.files = files
+        snapshot.version = version
+        if changed:
+            snapshot._document_of = {
+                relpath: self._document_of[relpath] if relpath not in changed else self._document(relpath, entry)
+                for relpath, entry in files.items()
+            }
+            snapshot.documents = [document for document in snapshot._document_of.values() if document]
+        if removed or added:
+            snapshot.chunks = [chunk for entry in files.values() for chunk in entry.get("chunks", [])]
+            snapshot.by_id = dict(self.by_id)
+            for chunk in removed:
+                del snapshot.by_id[chunk["id"]]
+            snapshot.by_id.update((chunk["id"], chunk) for chunk in added)
+            topics = Counter(self._topics)
+            topics.subtract(filter(None, map(self._topic, removed)))
+            topics.update(filter(None, map(self._topic, added)))
+            snapshot._topics = +topics
+            snapshot.lexical = self.lexical.updated(removed, added)
+        return snapshot
@@ -0,0 +1,414 @@
+"""
+Ingest - Staged, parallel ingestion of knowledge base files
+
+    list paths -> readers (threads) -> scan + chunk (processes) -> collect -> embed (thread)
+
+Each arrow is a bounded queue, so a fast stage waits for a slow one instead
+of piling up work in memory:
+
+- readers stat each file and reuse its manifest entry when size/mtime or the
+  file hash are unchanged; only changed files are passed on
+- reading, secret scanning (secret_scanner.py) and chunking are CPU-bound, so
+  they run in a process pool (inline for small batches, where starting
+  processes costs more than it saves). In "reject" mode a file is scanned on
+  disk before it is read, so one holding a secret is never loaded
+- the collector keeps results in path order and sends chunks that still need
+  an embedding to the sink in batches of `batch_size` as soon as they exist,
+  so embedding overlaps with reading and chunking
+
+If the collector fails, a stop event releases every stage waiting on a
+queue, so the error propagates instead of leaving readers blocked on a full
+one.
+
+Every stage keeps counters (items, bytes, busy seconds) in IngestStats.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from chunker import iter_chunks
+from index_store import chunk_id, file_hash
+from secret_scanner import get_scanner
+
+# What to do with a file that contains a secret: skip it, or index it with
+# each secret replaced by a [REDACTED:<rule>] placeholder
+SECRET_MODES = ("reject", "redact")
+
+_DONE = object()
+_REJECTED = object()
+
+# How often a stage blocked on a queue checks whether the run was stopped
+_POLL_SECONDS = 0.1
+
+
+def _put(q: "queue.Queue", item, stop: threading.Event) -> bool:
+    """Put on a bounded queue unless the run stops first; returns whether it was put."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=_POLL_SECONDS)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def _get(q: "queue.Queue", stop: threading.Event):
+    """Take from a queue, or _DONE once the run stops."""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+def process_document(relpath: str, path: str, chunk_tokens: int, overlap_tokens: int,
+                     secret_mode: str = "reject",
+                     secret_rules: Optional[str] = None) -> Tuple[Optional[List[dict]], Dict[str, int]]:
+    """Read, secret-scan and chunk one document.
+
+    Returns (chunks, secret hits per rule); chunks is None if the document
+    was rejected. Module-level so it can run in a worker process.
+    """
+    scanner = get_scanner(secret_rules)
+    if secret_mode == "reject":
+        # Scanned on disk (memory-mapped when large) before it is read, so a
+        # file with a secret is never decoded or held in memory
+        hits = scanner.scan_file(path)
+        if hits:
+            return None, dict(hits)
+    content = Path(path).read_text(encoding="utf-8")
+    if secret_mode == "redact":
+        content, hits = scanner.redact(content)
+    chunks = []
+    for i, chunk in enumerate(iter_chunks(content, Path(path).name, chunk_tokens, overlap_tokens)):
+        chunk.pop("tokens", None)
+        chunk["id"] = chunk_id(relpath, i, chunk["content"])
+        chunks.append(chunk)
+    return chunks, dict(hits)
+
+
+def _process_timed(*args) -> Tuple[float, Optional[List[dict]], Dict[str, int]]:
+    began = time.perf_counter()
+    chunks, hits = process_document(*args)
+    return time.perf_counter() - began, chunks, hits
+
+
+class IngestStats:
+    """Per-stage counters for one ingestion run (thread-safe)."""
+
+    STAGES = ("list", "read", "process", "embed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.wall_seconds = 0.0
+        self.stages = {stage: {"items": 0, "bytes": 0, "seconds": 0.0} for stage in self.STAGES}
+        self.unchanged = 0     # trusted from size/mtime
+        self.reused = 0        # read, but the hash was unchanged
+        self.rejected = 0
+        self.redacted = 0
+        self.secret_hits: Dict[str, int] = {}   # per rule id
+        self.chunks = 0
+        self.errors = 0
+
+    def add(self, stage: str, items: int = 1, nbytes: int = 0, seconds: float = 0.0):
+        with self._lock:
+            counters = self.stages[stage]
+            counters["items"] += items
+            counters["bytes"] += nbytes
+            counters["seconds"] += seconds
+
+    def count(self, field: str, n: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+    def add_secret_hits(self, hits: Dict[str, int]):
+        with self._lock:
+            for rule_id, n in hits.items():
+                self.secret_hits[rule_id] = self.secret_hits.get(rule_id, 0) + n
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self._started
+
+    def as_dict(self) -> dict:
+        """Counters plus throughput: items/s of busy time per stage and overall."""
+        with self._lock:
+            wall = self.wall_seconds or (time.perf_counter() - self._started)
+            stages = {}
+            for stage, counters in self.stages.items():
+                busy = counters["seconds"]
+                stages[stage] = dict(
+                    counters,
+                    items_per_second=counters["items"] / busy if busy else 0.0,
+                    mb_per_second=counters["bytes"] / 1e6 / busy if busy else 0.0
+                )
+            return {
+                "wall_seconds": wall,
+                "files_per_second": self.stages["list"]["items"] / wall if wall else 0.0,
+                "stages": stages,
+                "unchanged": self.unchanged,
+                "reused": self.reused,
+                "rejected": self.rejected,
+                "redacted": self.redacted,
+                "secret_hits": dict(self.secret_hits),
+                "chunks": self.chunks,
+                "errors": self.errors
+            }
+
+
+class IngestPipeline:
+    """Reads, scans and chunks a set of files in parallel, reusing manifest entries."""
+
+    def __init__(self, kb_path: Path, chunk_tokens: int, overlap_tokens: int,
+                 readers: int = 8, workers: Optional[int] = None, batch_size: int = 1000,
+                 queue_size: int = 256, min_parallel: int = 64,
+                 secret_mode: str = "reject", secret_rules: Optional[str] = None,
+                 log: Callable[[str], None] = print):
+        """
+        Args:
+            kb_path: Knowledge base root; entries are keyed by path relative to it.
+            chunk_tokens, overlap_tokens: Chunker settings.
+            readers: File reader threads.
+            workers: Scan/chunk processes (default: CPU count; 1 = inline).
+            batch_size: Chunks per sink call.
+            queue_size: Capacity of each inter-stage queue.
+            min_parallel: Below this many files, scan and chunk inline.
+            secret_mode: "reject" skips files containing a secret, "redact"
+                indexes them with the secrets masked.
+            secret_rules: JSON rules file for the secret scanner (default rules if None).
+            log: Progress/alert output.
+        """
+        self.kb_path = kb_path
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.readers = readers
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.min_parallel = min_parallel
+        if secret_mode not in SECRET_MODES:
+            raise ValueError(f"secret_mode must be one of {SECRET_MODES}")
+        self.secret_mode = secret_mode
+        self.secret_rules = secret_rules
+        self.log = log
+        self.stats = IngestStats()
+        self.sink_error: Optional[BaseException] = None
+        self._pool_failed = False
+
+    def run(self, md_files: Iterable[Path], previous: Dict[str, dict],
+            sink: Optional[Callable[[List[dict]], None]] = None,
+            embedded_ids: Optional[Set[str]] = None) -> Tuple[Dict[str, dict], List[dict]]:
+        """Ingest files.
+
+        Args:
+            md_files: Files to (re)consider.
+            previous: Manifest entries from the last run, keyed by relative path.
+            sink: Receives batches of chunks that need embedding while the
+                run is still going. If it raises, later batches are skipped
+                and the exception is kept in `sink_error`.
+            embedded_ids: Chunk ids already in the vector store; other chunks,
+                including ones reused from the manifest, are sent to the sink.
+                None sends only newly chunked chunks.
+
+        Returns:
+            tuple: (entries keyed by relative path, newly chunked chunks),
+            both in path order.
+        """
+        start = time.perf_counter()
+        paths = sorted(md_files)
+        self.stats.add("list", len(paths), seconds=time.perf_counter() - start)
+
+        use_pool = self.workers > 1 and len(paths) >= self.min_parallel
+        pool = None
+        if use_pool:
+            # forkserver/spawn: forking a process that runs threads can deadlock
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(method))
+
+        path_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        result_queue: "queue.Queue" = queue.Queue(maxsize=self.queue_size)
+        batch_queue: "queue.Queue" = queue.Queue(maxsize=2)
+        # Set when the collector fails, so no stage stays blocked on a queue nobody drains
+        stop = threading.Event()
+
+        def feed():
+            for order, path in enumerate(paths):
+                if not _put(path_queue, (order, path), stop):
+                    return
+            for _ in range(self.readers):
+                _put(path_queue, _DONE, stop)
+
+        def read():
+            while True:
+                item = _get(path_queue, stop)
+                if item is _DONE:
+                    _put(result_queue, _DONE, stop)
+                    return
+                order, path = item
+                if not _put(result_queue, (order, path, self._read(path, previous, pool)), stop):
+                    return
+
+        def embed():
+            while True:
+                batch = _get(batch_queue, stop)
+                if batch is _DONE:
+                    return
+                if self.sink_error is not None:
+                    continue
+                began = time.perf_counter()
+                try:
+                    sink(batch)
+                except Exception as e:
+                    self.sink_error = e
+                self.stats.add("embed", len(batch), seconds=time.perf_counter() - began)
+
+        threads = [threading.Thread(target=feed, name="ingest-list", daemon=True)]
+        threads += [threading.Thread(target=read, name=f"ingest-read-{i}", daemon=True) for i in range(self.readers)]
+        embedder = threading.Thread(target=embed, name="ingest-embed", daemon=True) if sink else None
+        for thread in threads + ([embedder] if embedder else []):
+            thread.start()
+
+        results: Dict[int, tuple] = {}
+        pending: List[dict] = []
+        try:
+            finished = 0
+            while finished < self.readers:
+                item = result_queue.get()
+                if item is _DONE:
+                    finished += 1
+                    continue
+                order, path, (relpath, entry, work) = item
+                if isinstance(work, Future):
+                    work = self._collect(work, entry, path)
+                    if work is None:
+                        entry = None
+                if isinstance(work, tuple):
+                    work, hits = work
+                    if hits:
+                        self.stats.add_secret_hits(hits)
+                        rules = ", ".join(sorted(hits))
+                        if work is _REJECTED:
+                            self.log(f"⚠️ SECURITY ALERT: Found potential secret ({rules}) in {path.name}. Skipping.")
+                        else:
+                            entry["redacted"] = True
+                            self.stats.count("redacted")
+                            self.log(f"⚠️ SECURITY ALERT: Redacted potential secret ({rules}) in {path.name}.")
+                if work is _REJECTED:
+                    entry["rejected"] = True
+                    self.stats.count("rejected")
+                    work = None
+                elif work is not None:
+                    entry["chunks"] = work
+                    self.stats.count("chunks", len(work))
+                    self.log(f"📄 Loaded: {path.name}")
+                results[order] = (relpath, entry, work is not None)
+
+                if sink and entry is not None:
+                    pending.extend(
+                        chunk for chunk in entry["chunks"]
+                        if (chunk["id"] not in embedded_ids if embedded_ids is not None else work is not None)
+                    )
+                    while len(pending) >= self.batch_size:
+                        batch_queue.put(pending[:self.batch_size])
+                        del pending[:self.batch_size]
+        except BaseException:
+            # Readers may be blocked on a full queue: stop every stage, drop queued work
+            stop.set()
+            raise
+        finally:
+            if sink:
+                if not stop.is_set():
+                    if pending:
+                        batch_queue.put(pending)
+                    batch_queue.put(_DONE)
+                embedder.join()
+            for thread in threads:
+                thread.join()
+            if pool is not None:
+                pool.shutdown(cancel_futures=stop.is_set())
+            self.stats.finish()
+
+        current: Dict[str, dict] = {}
+        new_chunks: List[dict] = []
+        for order in sorted(results):
+            relpath, entry, chunked = results[order]
+            if entry is None:
+                continue
+            current[relpath] = entry
+            if chunked:
+                new_chunks.extend(entry["chunks"])
+        return current, new_chunks
+
+    def _read(self, path: Path, previous: Dict[str, dict], pool: Optional[ProcessPoolExecutor]):
+        """Reader stage: returns (relpath, entry, work).
+
+        work is (new chunks or _REJECTED, secret hits), a Future for that, or
+        None when the previous entry is reused; entry is None if the file failed.
+        """
+        relpath = path.relative_to(self.kb_path).as_posix()
+        began = time.perf_counter()
+        try:
+            stat = path.stat()
+            entry = previous.get(relpath)
+
+            # Fast path: size and mtime unchanged, trust the manifest
+            if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                self.stats.count("unchanged")
+                return relpath, entry, None
+
+            # Hashed block by block; the text itself is only read by process_document
+            digest = file_hash(path)
+            self.stats.add("read", nbytes=stat.st_size, seconds=time.perf_counter() - began)
+
+            # Touched but identical content: keep chunks, refresh stat
+            if entry and entry["hash"] == digest:
+                self.stats.count("reused")
+                return relpath, dict(entry, size=stat.st_size, mtime_ns=stat.st_mtime_ns), None
+
+            entry = {
+                "hash": digest,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "filename": path.name,
+                "rejected": False,
+                "chunks": []
+            }
+            args = (relpath, str(path), self.chunk_tokens, self.overlap_tokens,
+                    self.secret_mode, self.secret_rules)
+            if pool is not None:
+                future = pool.submit(_process_timed, *args)
+                future.args = args
+                return relpath, entry, future
+
+            elapsed, chunks, hits = _process_timed(*args)
+            self.stats.add("process", nbytes=stat.st_size, seconds=elapsed)
+            return relpath, entry, (_REJECTED if chunks is None else chunks, hits)
+        except Exception as e:
+            self.stats.count("errors")
+            self.log(f"⚠️ Error loading {path}: {e}")
+            return relpath, None, None
+
+    def _collect(self, future: Future, entry: dict, path: Path):
+        """Wait for a worker result: (chunks or _REJECTED, hits), or None on failure."""
+        try:
+            elapsed, chunks, hits = future.result()
+        except Exception as e:
+            # A worker (or the whole pool) failed; redo this file in-process
+            if not self._pool_failed:
+                self._pool_failed = True
+                self.log(f"⚠️ Ingest worker failed ({type(e).__name__}), processing inline")
+            try:
+                elapsed, chunks, hits = _process_timed(*future.args)
+            except Exception as e:
+                self.stats.count("errors")
+                self.log(f"⚠️ Error loading {path}: {e}")
+                return None
+        self.stats.add("process", nbytes=entry["size"], seconds=elapsed)
+        return _REJECTED if chunks is None else chunks, hits
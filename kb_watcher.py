@@ -0,0 +1,175 @@
+"""
+Knowledge Base Watcher - Hot incremental index updates on doc edits
+
+Uses watchdog (inotify on Linux, FSEvents/ReadDirectoryChangesW elsewhere)
+when it is installed, and falls back to polling file stats otherwise. Events
+are debounced: a burst of saves is collected until the directory has been
+quiet for `debounce` seconds, then the affected paths are handed to the
+`on_change` callback in one batch (typically RAGEngine.refresh).
+"""
+
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Optional, Set, Tuple
+
+
+class KnowledgeBaseWatcher:
+    """Watches a knowledge base directory and reports changed markdown files."""
+
+    def __init__(self, knowledge_base_path: str,
+                 on_change: Callable[[Optional[Set[str]]], None],
+                 debounce: float = 1.0, poll_interval: float = 2.0):
+        """
+        Args:
+            knowledge_base_path: Directory to watch.
+            on_change: Called with the set of changed paths relative to the
+                knowledge base, or None when a full rescan is needed
+                (e.g. a whole directory was moved or deleted).
+            debounce: Quiet period in seconds before a batch is applied.
+            poll_interval: Seconds between scans in polling mode.
+        """
+        self.kb_path = Path(knowledge_base_path).resolve()
+        self.on_change = on_change
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.mode = None
+
+        self._cond = threading.Condition()
+        self._pending: Set[str] = set()
+        self._full_rescan = False
+        self._last_event = 0.0
+        self._stop = threading.Event()
+        self._observer = None
+        self._threads = []
+
+    def _safe_print(self, text: str):
+        """Safely print text handling unicode characters on Windows."""
+        try:
+            print(text)
+        except UnicodeEncodeError:
+            print(text.encode('ascii', 'replace').decode('ascii'))
+
+    def start(self):
+        """Start watching in background daemon threads."""
+        if not self._start_watchdog():
+            self.mode = "polling"
+            self._spawn(self._poll_loop, "kb-watcher-poll")
+        self._spawn(self._apply_loop, "kb-watcher-apply")
+        self._safe_print(f"👀 Watching {self.kb_path} for changes ({self.mode})")
+
+    def stop(self):
+        """Stop watching; pending events that haven't been applied are dropped."""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join(timeout=5)
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def _spawn(self, target, name: str):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _start_watchdog(self) -> bool:
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return False
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type in ("opened", "closed_no_write"):
+                    return
+                if event.is_directory:
+                    # Directory moves/deletes don't list the files inside them
+                    if event.event_type in ("moved", "deleted"):
+                        watcher._notify(None)
+                    return
+                watcher._notify(event.src_path)
+                if getattr(event, "dest_path", None):
+                    watcher._notify(event.dest_path)
+
+        try:
+            self._observer = Observer()
+            self._observer.schedule(_Handler(), str(self.kb_path), recursive=True)
+            self._observer.daemon = True
+            self._observer.start()
+        except Exception as e:
+            self._safe_print(f"⚠️ File watcher unavailable ({e}). Falling back to polling.")
+            self._observer = None
+            return False
+
+        self.mode = "native"
+        return True
+
+    def _notify(self, path: Optional[str]):
+        """Record an event; None requests a full rescan."""
+        with self._cond:
+            if path is None:
+                self._full_rescan = True
+            else:
+                if not str(path).endswith(".md"):
+                    return
+                try:
+                    relpath = Path(path).resolve().relative_to(self.kb_path).as_posix()
+                except ValueError:
+                    return
+                self._pending.add(relpath)
+            self._last_event = time.monotonic()
+            self._cond.notify_all()
+
+    def _apply_loop(self):
+        """Wait for a quiet period after the last event, then apply the batch."""
+        while not self._stop.is_set():
+            with self._cond:
+                while not (self._pending or self._full_rescan) and not self._stop.is_set():
+                    self._cond.wait()
+                # Debounce: keep waiting while events are still arriving
+                while not self._stop.is_set():
+                    remaining = self._last_event + self.debounce - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stop.is_set():
+                    return
+
+                batch = None if self._full_rescan else set(self._pending)
+                self._pending.clear()
+                self._full_rescan = False
+
+            try:
+                self.on_change(batch)
+            except Exception as e:
+                self._safe_print(f"⚠️ Error applying knowledge base changes: {e}")
+
+    def _snapshot_stats(self) -> Dict[str, Tuple[int, int]]:
+        stats = {}
+        for root, _, files in os.walk(self.kb_path):
+            for name in files:
+                if not name.endswith(".md"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                stats[path] = (st.st_mtime_ns, st.st_size)
+        return stats
+
+    def _poll_loop(self):
+        """Polling fallback: diff file stats every poll_interval seconds."""
+        known = self._snapshot_stats()
+        while not self._stop.wait(self.poll_interval):
+            current = self._snapshot_stats()
+            for path in current.keys() | known.keys():
+                if current.get(path) != known.get(path):
+                    self._notify(path)
+            known = current
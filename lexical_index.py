@@ -0,0 +1,259 @@
+"""
+Lexical Index - BM25 inverted index for keyword retrieval
+
+Queries only touch the postings lists of their own terms, so query cost
+scales with how common the query terms are, not with the size of the corpus.
+
+An index is never modified once built. `updated()` returns a new index with
+some chunks removed and others added: only the postings of the terms those
+chunks contain are rebuilt, every other list is shared with the old index.
+Each chunk occupies a slot (a small integer, reused after deletion), and a
+postings list is two arrays of slots and term frequencies, so the whole
+index can be saved and loaded as raw bytes (see IndexStore).
+"""
+
+import heapq
+import itertools
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Identifiers like `deploy-service`, `API_KEY`, `--dry-run` and `v1.2` stay whole
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[._\-][a-z0-9]+)*")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from how i in is it of on or that the this "
+    "to was what when where which who why with you your do does can my we our".split()
+)
+
+# Longest suffixes first; a light Porter-style stemmer is enough to match
+# "deploy", "deploys", "deployed", "deploying" and "deployment"
+_SUFFIXES = ("ization", "ational", "ation", "ments", "ment", "ings", "ing",
+             "edly", "ers", "ed", "er", "ly")
+
+
+def stem(token: str) -> str:
+    """Reduce a token to a crude stem, keeping at least 3 letters."""
+    if len(token) <= 3 or not token.isalpha():
+        return token
+
+    # Plurals: processes -> process, policies -> policy, services -> service
+    if token.endswith("sses"):
+        token = token[:-2]
+    elif token.endswith("ies") and len(token) > 4:
+        token = token[:-3] + "y"
+    elif token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        token = token[:-1]
+
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            token = token[:-len(suffix)]
+            # running -> runn -> run
+            if token[-1] == token[-2] and token[-1] not in "lsz":
+                token = token[:-1]
+            break
+
+    # configure / configured / configuration all end up as "configur"
+    if token.endswith("e") and len(token) > 4:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, split on punctuation, drop stopwords and stem."""
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        tokens.append(stem(token))
+        # Also index the parts of compound identifiers (`deploy-service` -> deploy, service)
+        if not token.isalnum():
+            tokens.extend(stem(part) for part in re.split(r"[._\-]", token) if part and part not in _STOPWORDS)
+    return tokens
+
+
+# Bump when tokenize() changes, so saved postings are rebuilt
+LEXICAL_FORMAT = 1
+
+_generations = itertools.count(1)
+
+
+class BM25Index:
+    """Okapi BM25 over a set of chunks, keyed by chunk id."""
+
+    def __init__(self, chunks: Iterable[dict] = (), k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+
+        # term -> (slots, term frequencies), two parallel arrays
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.doc_ids: List[Optional[str]] = []   # slot -> chunk id (None: free)
+        self.doc_lengths = array("I")             # slot -> tokens
+        self.slot_of: Dict[str, int] = {}
+        self.total_length = 0
+        self._norm: Optional[List[float]] = None
+
+        # Writes since the index this one was derived from (None: everything)
+        self.generation = next(_generations)
+        self.base_generation: Optional[int] = None
+        self.changed_terms: Optional[Set[str]] = None
+        self.changed_slots: Optional[Set[int]] = None
+
+        for chunk in chunks:
+            if chunk["id"] not in self.slot_of:
+                self._add_doc(chunk["id"], Counter(tokenize(chunk["content"])), self.postings)
+
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+    @property
+    def avg_doc_length(self) -> float:
+        return self.total_length / len(self.slot_of) if self.slot_of else 0.0
+
+    def _add_doc(self, cid: str, counts: Counter, postings: Dict[str, Tuple[array, array]],
+                 free: Optional[List[int]] = None) -> int:
+        length = sum(counts.values())
+        if free:
+            slot = free.pop()
+            self.doc_ids[slot] = cid
+            self.doc_lengths[slot] = length
+        else:
+            slot = len(self.doc_ids)
+            self.doc_ids.append(cid)
+            self.doc_lengths.append(length)
+        self.slot_of[cid] = slot
+        self.total_length += length
+        for term, tf in counts.items():
+            lists = postings.get(term)
+            if lists is None:
+                lists = postings[term] = (array("I"), array("I"))
+            lists[0].append(slot)
+            lists[1].append(tf)
+        return slot
+
+    def updated(self, removed: Iterable[dict], added: Iterable[dict]) -> "BM25Index":
+        """A new index without the `removed` chunks and with the `added` ones.
+
+        Cost is proportional to the postings of the terms those chunks
+        contain; this index is left untouched for queries still using it.
+        """
+        index = BM25Index(k1=self.k1, b=self.b)
+        index.doc_ids = list(self.doc_ids)
+        index.doc_lengths = array("I", self.doc_lengths)
+        index.slot_of = dict(self.slot_of)
+        index.total_length = self.total_length
+        index.base_generation = self.generation
+
+        # Slots dropped from each term's postings
+        dropped: Dict[str, Set[int]] = {}
+        changed_slots: Set[int] = set()
+        for chunk in removed:
+            slot = index.slot_of.pop(chunk["id"], None)
+            if slot is None:
+                continue
+            for term in set(tokenize(chunk["content"])):
+                dropped.setdefault(term, set()).add(slot)
+            index.total_length -= index.doc_lengths[slot]
+            index.doc_ids[slot] = None
+            index.doc_lengths[slot] = 0
+            changed_slots.add(slot)
+
+        # Postings of the added chunks, reusing freed slots
+        free = [slot for slot in range(len(index.doc_ids) - 1, -1, -1) if index.doc_ids[slot] is None]
+        appended: Dict[str, Tuple[array, array]] = {}
+        for chunk in added:
+            if chunk["id"] in index.slot_of:
+                continue
+            changed_slots.add(index._add_doc(chunk["id"], Counter(tokenize(chunk["content"])), appended, free))
+
+        postings = dict(self.postings)
+        for term in dropped.keys() | appended.keys():
+            slots, tfs = postings.get(term) or (array("I"), array("I"))
+            gone = dropped.get(term)
+            if gone:
+                keep = [i for i, slot in enumerate(slots) if slot not in gone]
+                slots = array("I", [slots[i] for i in keep])
+                tfs = array("I", [tfs[i] for i in keep])
+            else:
+                slots, tfs = array("I", slots), array("I", tfs)
+            extra = appended.get(term)
+            if extra:
+                slots.extend(extra[0])
+                tfs.extend(extra[1])
+            if slots:
+                postings[term] = (slots, tfs)
+            else:
+                postings.pop(term, None)
+        index.postings = postings
+        index.changed_terms = dropped.keys() | appended.keys()
+        index.changed_slots = changed_slots
+        return index
+
+    @classmethod
+    def restore(cls, docs: Iterable[Tuple[int, str, int]], terms: Iterable[Tuple[str, bytes, bytes]],
+                k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Rebuild an index from saved (slot, chunk id, length) and (term, slots, tfs) rows."""
+        index = cls(k1=k1, b=b)
+        docs = list(docs)
+        size = max((slot for slot, _, _ in docs), default=-1) + 1
+        index.doc_ids = [None] * size
+        index.doc_lengths = array("I", bytes(index.doc_lengths.itemsize * size))
+        for slot, cid, length in docs:
+            index.doc_ids[slot] = cid
+            index.doc_lengths[slot] = length
+            index.slot_of[cid] = slot
+        index.total_length = sum(index.doc_lengths)
+        for term, slots, tfs in terms:
+            lists = (array("I"), array("I"))
+            lists[0].frombytes(slots)
+            lists[1].frombytes(tfs)
+            index.postings[term] = lists
+        return index
+
+    def doc_rows(self, slots: Optional[Iterable[int]] = None) -> Iterable[Tuple[int, Optional[str], int]]:
+        """(slot, chunk id or None if free, length) rows for saving; all slots by default."""
+        for slot in range(len(self.doc_ids)) if slots is None else slots:
+            yield slot, self.doc_ids[slot], self.doc_lengths[slot]
+
+    def term_rows(self, terms: Optional[Iterable[str]] = None) -> Iterable[Tuple[str, Optional[bytes], Optional[bytes]]]:
+        """(term, slots, tfs) rows for saving, bytes None if the term is gone; all terms by default."""
+        for term in self.postings if terms is None else terms:
+            lists = self.postings.get(term)
+            yield (term, lists[0].tobytes(), lists[1].tobytes()) if lists else (term, None, None)
+
+    def matches(self, chunk_ids: Iterable[str]) -> bool:
+        """Whether this index covers exactly these chunks."""
+        count = 0
+        for cid in chunk_ids:
+            if cid not in self.slot_of:
+                return False
+            count += 1
+        return count == len(self.slot_of)
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[float, str]]:
+        """Return up to top_k (score, chunk id) pairs, best first."""
+        n_docs = len(self.slot_of)
+        if not n_docs:
+            return []
+        norm = self._norm
+        if norm is None:
+            # Per-document length normalisation, computed once per index
+            k1, b, avg = self.k1, self.b, self.avg_doc_length or 1.0
+            norm = self._norm = [k1 * (1 - b + b * length / avg) for length in self.doc_lengths]
+
+        scores: Dict[int, float] = {}
+        get = scores.get
+        k1 = self.k1
+        for term in set(tokenize(query)):
+            lists = self.postings.get(term)
+            if not lists:
+                continue
+            df = len(lists[0])
+            weight = math.log(1 + (n_docs - df + 0.5) / (df + 0.5)) * (k1 + 1)
+            for slot, tf in zip(*lists):
+                scores[slot] = get(slot, 0.0) + weight * tf / (tf + norm[slot])
+
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [(score, self.doc_ids[slot]) for slot, score in best]
@@ -0,0 +1,344 @@
+"""
+LLM Client - Deadlines, retries, hedging and a circuit breaker around Granite calls
+
+ModelInference calls block for as long as watsonx takes, and a client that
+failed to initialise at startup stays down until the app restarts.
+LLMClient wraps the model so that:
+
+- every call has a deadline; the request runs on a daemon thread and is
+  abandoned when the deadline passes (the SDK can't cancel it)
+- transient failures (timeouts, connection errors, 429/5xx) are retried
+  with jittered exponential backoff, inside the same deadline
+- optionally, a duplicate request is sent when the first one is slower than
+  the recent p95, and whichever answers first wins (hedging). This trims
+  the latency tail at the price of extra requests, so it is off by default
+- after `failure_threshold` calls in a row fail transiently, the circuit
+  opens: calls raise LLMUnavailable at once, so the engine answers in
+  fallback mode instead of making every user wait for a dead backend
+- while the backend is down (or never came up), a background thread
+  re-creates the client every `reset_timeout` seconds. Once that succeeds
+  one trial request is let through, and the circuit closes if it works
+
+Streams get the same treatment up to their first part; after that a
+failure is the caller's to handle, since text has already been shown.
+"""
+
+import logging
+import queue
+import random
+import re
+import threading
+import time
+from typing import Callable, Iterator, Optional
+
+import requests
+
+from metrics import Histogram, metrics
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: timeouts, rate limiting, server errors
+TRANSIENT_STATUS = {408, 425, 429, 500, 502, 503, 504}
+# Network failures as raised by requests (used by the watsonx SDK) and the stdlib
+TRANSIENT_ERRORS = (TimeoutError, ConnectionError, requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError)
+# Last resort for errors that only report the status in their text ("Status code: 503, body: ...")
+_STATUS_IN_MESSAGE = re.compile(r"\bstatus[ _]code\W{0,3}(\d{3})\b", re.IGNORECASE)
+
+# Hedging waits for this many successful calls before trusting the p95
+HEDGE_MIN_SAMPLES = 20
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_PART, _END, _ERROR = "part", "end", "error"
+
+
+class LLMUnavailable(RuntimeError):
+    """No model, or the circuit is open: answer without the LLM."""
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed call is worth retrying (and counts against the backend).
+
+    An HTTP status decides when the error has one: its own `status_code`, or
+    that of its `response` (requests' HTTPError, the SDK's ApiRequestFailure).
+    Otherwise only network errors are transient, and a message is trusted
+    only if it says "status code NNN".
+    """
+    if isinstance(error, LLMUnavailable):
+        return False
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS
+    if isinstance(error, TRANSIENT_ERRORS):
+        return True
+    match = _STATUS_IN_MESSAGE.search(str(error))
+    return match is not None and int(match.group(1)) in TRANSIENT_STATUS
+
+
+class LLMClient:
+    """Resilient wrapper around a ModelInference-like model."""
+
+    def __init__(self, connect: Callable[[], object], deadline: float = 60.0, retries: int = 2,
+                 backoff: float = 0.5, hedge: bool = False, hedge_min_delay: float = 1.0,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            connect: Creates a new model client; raises if the backend can't be reached.
+            deadline: Seconds a call may take, retries included.
+            retries: Extra attempts after a transient failure.
+            backoff: Base delay in seconds before a retry (doubles each time).
+            hedge: Send a duplicate request when the first is slower than the recent p95.
+            hedge_min_delay: Never hedge earlier than this many seconds.
+            failure_threshold: Consecutive failed calls that open the circuit.
+            reset_timeout: Seconds between reconnection attempts while down.
+        """
+        self.model = None
+        self._connect = connect
+        self.deadline = deadline
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+
+        self.last_error: Optional[BaseException] = None
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._trial = False
+        self._latency = Histogram(window=256)
+        self._recovery: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def state(self) -> str:
+        """Circuit state: closed, open or half_open."""
+        return self._state
+
+    def available(self) -> bool:
+        """Whether a call would be attempted right now."""
+        with self._lock:
+            if self.model is None or self._state == OPEN:
+                return False
+            return not (self._state == HALF_OPEN and self._trial)
+
+    # -- calls -----------------------------------------------------------
+
+    def generate_text(self, prompt: str, deadline: Optional[float] = None) -> str:
+        """Generate text within `deadline` seconds (default: the client's).
+
+        Raises:
+            LLMUnavailable: No model, or the circuit is open.
+            TimeoutError: No answer before the deadline.
+        """
+        model = self._admit()
+        timeout = deadline or self.deadline
+        deadline_at = time.monotonic() + timeout
+        attempt = 0
+        try:
+            while True:
+                try:
+                    text = self._attempt(model, prompt, deadline_at, timeout)
+                except Exception as e:
+                    if is_transient(e) and self._may_retry(attempt, deadline_at):
+                        attempt += 1
+                        continue
+                    self._record_failure(e)
+                    raise
+                self._record_success()
+                return text
+        finally:
+            self._release()
+
+    def generate_text_stream(self, prompt: str, deadline: Optional[float] = None) -> Iterator[str]:
+        """Stream text; each part must arrive within `deadline` seconds of the last.
+
+        Retries and the circuit breaker apply until the first part arrives.
+        """
+        model = self._admit()
+        timeout = deadline or self.deadline
+        attempt = 0
+        try:
+            while True:
+                parts: queue.Queue = queue.Queue()
+                stop = threading.Event()
+
+                def pump(parts=parts, stop=stop):
+                    try:
+                        for text in model.generate_text_stream(prompt=prompt):
+                            if stop.is_set():
+                                return
+                            parts.put((_PART, text))
+                        parts.put((_END, None))
+                    except Exception as e:
+                        parts.put((_ERROR, e))
+
+                threading.Thread(target=pump, name="llm-stream", daemon=True).start()
+                started = False
+                try:
+                    while True:
+                        try:
+                            kind, value = parts.get(timeout=timeout)
+                        except queue.Empty:
+                            raise TimeoutError(f"no response within {timeout:g}s") from None
+                        if kind == _END:
+                            if not started:
+                                self._record_success()
+                            return
+                        if kind == _ERROR:
+                            raise value
+                        if not started:
+                            started = True
+                            self._record_success()
+                        yield value
+                except Exception as e:
+                    if not started:
+                        if is_transient(e) and self._may_retry(attempt, time.monotonic() + timeout):
+                            attempt += 1
+                            continue
+                        self._record_failure(e)
+                    raise
+                finally:
+                    stop.set()
+        finally:
+            self._release()
+
+    def _attempt(self, model, prompt: str, deadline_at: float, timeout: float) -> str:
+        """One call, plus a hedged duplicate if it runs past the hedge delay."""
+        results: queue.Queue = queue.Queue()
+
+        def call(hedged: bool):
+            began = time.perf_counter()
+            try:
+                results.put((True, model.generate_text(prompt=prompt), time.perf_counter() - began, hedged))
+            except Exception as e:
+                results.put((False, e, 0.0, hedged))
+
+        threading.Thread(target=call, args=(False,), name="llm-generate", daemon=True).start()
+        pending = 1
+        hedge_at = self._hedge_delay()
+        if hedge_at is not None:
+            hedge_at += time.monotonic()
+        error: Optional[Exception] = None
+        while pending:
+            now = time.monotonic()
+            if now >= deadline_at:
+                raise TimeoutError(f"no response within {timeout:g}s")
+            wait = deadline_at - now
+            if hedge_at is not None:
+                wait = min(wait, max(0.0, hedge_at - now))
+            try:
+                ok, value, elapsed, hedged = results.get(timeout=wait)
+            except queue.Empty:
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    pending += 1
+                    metrics.inc("llm_hedges_total")
+                    threading.Thread(target=call, args=(True,), name="llm-hedge", daemon=True).start()
+                continue
+            pending -= 1
+            if ok:
+                with self._lock:
+                    self._latency.observe(elapsed)
+                if hedged:
+                    metrics.inc("llm_hedge_wins_total")
+                return value
+            error = value
+            # The other request may still answer
+        raise error
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge:
+            return None
+        with self._lock:
+            if self._latency.count < HEDGE_MIN_SAMPLES:
+                return None
+            return max(self.hedge_min_delay, self._latency.quantiles()[0.95])
+
+    def _may_retry(self, attempt: int, deadline_at: float) -> bool:
+        """Sleep the backoff and return True if another attempt fits in the deadline."""
+        if attempt >= self.retries or self._state == OPEN:
+            return False
+        pause = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.0)
+        if time.monotonic() + pause >= deadline_at:
+            return False
+        metrics.inc("llm_retries_total")
+        time.sleep(pause)
+        return True
+
+    # -- circuit breaker -------------------------------------------------
+
+    def _admit(self):
+        """The model to call, or LLMUnavailable; claims the trial when half-open."""
+        with self._lock:
+            if self.model is None:
+                raise LLMUnavailable("model not initialized")
+            if self._state == OPEN:
+                raise LLMUnavailable("model backend unavailable (circuit open)")
+            if self._state == HALF_OPEN:
+                if self._trial:
+                    raise LLMUnavailable("model backend recovering")
+                self._trial = True
+            return self.model
+
+    def _release(self):
+        # A half-open trial that ended without a verdict (e.g. a stream the
+        # caller stopped reading) lets the next call try instead
+        with self._lock:
+            self._trial = False
+
+    def _record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial = False
+            if self._state != CLOSED:
+                self._state = CLOSED
+                self.last_error = None
+
+    def _record_failure(self, error: BaseException):
+        if not is_transient(error):
+            # The backend answered (e.g. rejected the prompt), so it is up
+            self._record_success()
+            return
+        with self._lock:
+            self.last_error = error
+            self._failures += 1
+            self._trial = False
+            if self._state == OPEN or (self._state == CLOSED and self._failures < self.failure_threshold):
+                return
+            self._state = OPEN
+        metrics.inc("llm_circuit_opens_total")
+        logger.warning("Model backend unhealthy, answering in fallback mode: %s", error)
+        self.recover()
+
+    def recover(self):
+        """Reconnect in the background until it works (no-op if already trying)."""
+        with self._lock:
+            if self._recovery is not None or self._stopped.is_set():
+                return
+            self._recovery = threading.Thread(target=self._recover_loop, name="llm-recover", daemon=True)
+            self._recovery.start()
+
+    def _recover_loop(self):
+        while not self._stopped.wait(self.reset_timeout):
+            try:
+                model = self._connect()
+            except Exception as e:
+                self.last_error = e
+                continue
+            with self._lock:
+                self.model = model
+                self._recovery = None
+                # A circuit opened by failed calls gets one trial request first
+                if self._state == OPEN:
+                    self._state = HALF_OPEN
+            logger.info("Model backend reconnected")
+            return
+
+    def close(self):
+        """Stop reconnecting (the engine is being retired)."""
+        self._stopped.set()
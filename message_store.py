@@ -0,0 +1,256 @@
+"""
+Message Store - Bounded chat history with large payloads spilled to disk
+
+Chat history lives in st.session_state, which stays in server memory for
+every open session. Keeping raw MP3 bytes and full source chunks there made
+each session grow by hundreds of KB per answer, with no upper bound.
+
+A ChatHistory keeps only lightweight message dicts in the session:
+
+- audio, and text over `inline_limit` bytes, go to a content-addressed
+  BlobCache on disk (.teammind_sessions/, shared by app processes) and the
+  message keeps the key ("audio_ref", "content_ref"). They are read back
+  lazily, when a message is rendered
+- sources are cut down to what the chat shows (file name and a snippet)
+
+MessageStore enforces the limits. A session over RAG_SESSION_MAX_MESSAGES
+or RAG_SESSION_MAX_KB loses its oldest messages, and when all sessions
+together pass RAG_SESSIONS_MAX_MB, the largest sessions are trimmed first.
+Spilled blobs are evicted LRU once the directory passes RAG_MESSAGE_MAX_MB;
+a message whose audio has been evicted simply renders without it.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+import weakref
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from audio_cache import BlobCache
+from metrics import metrics
+
+SNIPPET_CHARS = 200
+
+# Bookkeeping fields that are not part of the message itself
+_INTERNAL = ("id", "nbytes")
+
+
+def _message_bytes(message: dict) -> int:
+    """Approximate memory a message holds (its JSON size)."""
+    return len(json.dumps(message, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class ChatHistory:
+    """One session's messages: a list of small dicts, payloads by reference.
+
+    Behaves like the plain list it replaces (append, len, indexing,
+    iteration); use `content()` and `audio()` to read spilled payloads.
+    """
+
+    def __init__(self, store: "MessageStore", session_id: str):
+        self.store = store
+        self.session_id = session_id
+        self.messages: List[dict] = []
+        self.nbytes = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    # -- list interface --------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def __iter__(self) -> Iterator[dict]:
+        return iter(list(self.messages))
+
+    def __getitem__(self, index):
+        return self.messages[index]
+
+    def __bool__(self) -> bool:
+        return bool(self.messages)
+
+    def append(self, message: dict) -> dict:
+        """Add a message ({"role", "content", optional "sources", "audio", ...}).
+
+        Returns the stored (lightweight) message.
+        """
+        stored = self.store.compact(message)
+        stored["id"] = uuid.uuid4().hex[:12]
+        stored["nbytes"] = _message_bytes(stored)
+        with self._lock:
+            self.messages.append(stored)
+            self.nbytes += stored["nbytes"]
+        self.store.enforce(self)
+        return stored
+
+    def reset(self, messages: Iterable[dict] = ()):
+        """Replace the history (e.g. when the chat mode changes)."""
+        with self._lock:
+            self.messages = []
+            self.nbytes = 0
+            self.evicted = 0
+        for message in messages:
+            self.append(message)
+
+    # -- payloads --------------------------------------------------------
+
+    def content(self, message: dict) -> str:
+        """The message text, read from disk if it was spilled."""
+        if "content_ref" in message:
+            data = self.store.blobs.get(message["content_ref"])
+            return data.decode("utf-8") if data is not None else message["content"]
+        return message["content"]
+
+    def audio(self, message: dict) -> Optional[bytes]:
+        """The message's audio, read from disk (None if it has none or was evicted)."""
+        if "audio_ref" not in message:
+            return None
+        return self.store.blobs.get(message["audio_ref"])
+
+    # -- limits ----------------------------------------------------------
+
+    def evict_oldest(self, keep_bytes: int, keep_messages: int) -> int:
+        """Drop the oldest messages until within both limits; returns bytes freed."""
+        freed = 0
+        with self._lock:
+            while self.messages and (len(self.messages) > keep_messages or self.nbytes > keep_bytes):
+                message = self.messages.pop(0)
+                self.nbytes -= message["nbytes"]
+                freed += message["nbytes"]
+                self.evicted += 1
+        return freed
+
+    def usage(self) -> dict:
+        """Memory held by this session, and what was spilled or evicted."""
+        with self._lock:
+            messages = list(self.messages)
+        return {
+            "messages": len(messages),
+            "memory_bytes": self.nbytes,
+            "spilled_bytes": sum(message.get("spilled_bytes", 0) for message in messages),
+            "evicted_messages": self.evicted
+        }
+
+
+class MessageStore:
+    """Process-wide limits and disk spill for every session's ChatHistory."""
+
+    def __init__(self, directory: Optional[str] = None, max_disk_mb: Optional[int] = None,
+                 session_max_messages: Optional[int] = None, session_max_kb: Optional[int] = None,
+                 total_max_mb: Optional[int] = None, inline_limit: int = 16 * 1024):
+        """
+        Args:
+            directory: Blob directory (RAG_MESSAGE_DIR, default .teammind_sessions).
+            max_disk_mb: Budget for spilled blobs (RAG_MESSAGE_MAX_MB, default 512).
+            session_max_messages: Messages kept per session (RAG_SESSION_MAX_MESSAGES, default 200).
+            session_max_kb: In-memory size per session (RAG_SESSION_MAX_KB, default 512).
+            total_max_mb: In-memory size across sessions (RAG_SESSIONS_MAX_MB, default 64).
+            inline_limit: Text larger than this many bytes is spilled to disk.
+        """
+        directory = directory or os.getenv("RAG_MESSAGE_DIR", ".teammind_sessions")
+        max_disk_mb = max_disk_mb or int(os.getenv("RAG_MESSAGE_MAX_MB", "512"))
+        self.blobs = BlobCache(directory, max_bytes=max_disk_mb * 1024 * 1024, suffix=".blob")
+        self.session_max_messages = session_max_messages or int(os.getenv("RAG_SESSION_MAX_MESSAGES", "200"))
+        self.session_max_bytes = (session_max_kb or int(os.getenv("RAG_SESSION_MAX_KB", "512"))) * 1024
+        self.total_max_bytes = (total_max_mb or int(os.getenv("RAG_SESSIONS_MAX_MB", "64"))) * 1024 * 1024
+        self.inline_limit = inline_limit
+
+        self._lock = threading.Lock()
+        # Sessions disappear from here when Streamlit drops their state
+        self._sessions: "weakref.WeakValueDictionary[str, ChatHistory]" = weakref.WeakValueDictionary()
+        metrics.register_collector("message_store", self.metrics_gauges)
+
+    def history(self, session_id: Optional[str] = None) -> ChatHistory:
+        """A new, registered history for one session."""
+        history = ChatHistory(self, session_id or uuid.uuid4().hex)
+        with self._lock:
+            self._sessions[history.session_id] = history
+        return history
+
+    def spill(self, data: bytes) -> str:
+        """Store bytes on disk; returns their content address."""
+        key = hashlib.sha256(data).hexdigest()
+        if key not in self.blobs:
+            self.blobs.put(key, data)
+        return key
+
+    def compact(self, message: dict) -> dict:
+        """The lightweight form of a message: payloads spilled, sources trimmed."""
+        stored = {key: value for key, value in message.items()
+                  if key not in ("audio", "sources", *_INTERNAL)}
+        spilled = 0
+
+        audio = message.get("audio")
+        if audio:
+            stored["audio_ref"] = self.spill(audio)
+            spilled += len(audio)
+
+        content = message.get("content", "")
+        encoded = content.encode("utf-8")
+        if len(encoded) > self.inline_limit:
+            stored["content_ref"] = self.spill(encoded)
+            # Enough to show while the full text is read back
+            stored["content"] = content[:SNIPPET_CHARS] + "…"
+            spilled += len(encoded)
+
+        if message.get("sources"):
+            # Only what the citations panel shows, not whole chunks
+            stored["sources"] = [
+                {"source": source.get("source", ""), "snippet": source.get("content", "")[:SNIPPET_CHARS]}
+                for source in message["sources"]
+            ]
+        if spilled:
+            stored["spilled_bytes"] = spilled
+        return stored
+
+    def enforce(self, history: ChatHistory):
+        """Apply the per-session limits, then the global one."""
+        history.evict_oldest(self.session_max_bytes, self.session_max_messages)
+
+        with self._lock:
+            sessions = list(self._sessions.values())
+        total = sum(session.nbytes for session in sessions)
+        if total <= self.total_max_bytes:
+            return
+        # Trim the largest sessions down to the average share first
+        metrics.inc("message_store_global_evictions_total")
+        for session in sorted(sessions, key=lambda session: session.nbytes, reverse=True):
+            if total <= self.total_max_bytes:
+                break
+            share = self.total_max_bytes // max(1, len(sessions))
+            target = max(share, session.nbytes - (total - self.total_max_bytes))
+            total -= session.evict_oldest(target, self.session_max_messages)
+
+    def usage(self) -> dict:
+        """Memory held across sessions."""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            "sessions": len(sessions),
+            "memory_bytes": sum(session.nbytes for session in sessions),
+            "largest_session_bytes": max((session.nbytes for session in sessions), default=0)
+        }
+
+    def metrics_gauges(self) -> Dict[str, float]:
+        usage = self.usage()
+        return {
+            "chat_sessions": usage["sessions"],
+            "chat_memory_bytes": usage["memory_bytes"],
+            "chat_largest_session_bytes": usage["largest_session_bytes"]
+        }
+
+
+_message_store: Optional[MessageStore] = None
+_message_store_lock = threading.Lock()
+
+
+def get_message_store() -> MessageStore:
+    """Return the process-wide MessageStore (one set of limits for all sessions)."""
+    global _message_store
+    if _message_store is None:
+        with _message_store_lock:
+            if _message_store is None:
+                _message_store = MessageStore()
+    return _message_store
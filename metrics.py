@@ -0,0 +1,309 @@
+"""
+Metrics - Stage timings, counters and gauges with a Prometheus text endpoint
+
+Code wraps each stage of a request in a span:
+
+    with metrics.span("retrieval"):
+        ...
+
+Every span feeds a per-stage latency histogram, and counters and value
+histograms (e.g. prompt tokens) are recorded the same way. Components that
+own live numbers (cache hit ratios, index size) register a collector that
+is called at scrape time, so nothing has to be pushed on every change.
+
+- metrics.snapshot() returns everything as a dict (the sidebar uses it)
+- RAG_METRICS_PORT serves the Prometheus text format on /metrics from a
+  daemon http.server thread (off by default), on RAG_METRICS_HOST
+  (default 127.0.0.1; set 0.0.0.0 to expose it)
+- RAG_METRICS_LOG appends one JSON line per span to a file ("-" = stdout)
+
+Quantiles (p50/p95/p99) are computed over the most recent observations of
+each series, so they follow current behaviour rather than process lifetime;
+_sum and _count are lifetime totals, as Prometheus expects.
+"""
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW = 1024   # recent observations kept per series for quantiles
+PREFIX = "teammind_"
+
+_LabelKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+logger = logging.getLogger(__name__)
+
+
+def _key(name: str, labels: dict) -> _LabelKey:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Histogram:
+    """Lifetime count/sum plus a window of recent observations for quantiles."""
+
+    def __init__(self, window: int = WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.recent: deque = deque(maxlen=window)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.recent.append(value)
+
+    def quantiles(self) -> Dict[float, float]:
+        if not self.recent:
+            return {q: 0.0 for q in QUANTILES}
+        ordered = sorted(self.recent)
+        last = len(ordered) - 1
+        return {q: ordered[min(last, int(round(q * last)))] for q in QUANTILES}
+
+
+class Metrics:
+    """Thread-safe registry of histograms, counters and gauge collectors."""
+
+    def __init__(self, log_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._histograms: Dict[_LabelKey, Histogram] = {}
+        self._counters: Dict[_LabelKey, float] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: Dict[str, Callable[[], Optional[Dict[str, float]]]] = {}
+        self._log_path = log_path
+        self._log_lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    # -- recording -------------------------------------------------------
+
+    def observe(self, name: str, value: float, **labels):
+        """Add one observation to the histogram `name`."""
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Increase the counter `name`."""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def describe(self, name: str, text: str):
+        """HELP text for a metric family in the Prometheus output."""
+        self._help[name] = text
+
+    @contextmanager
+    def span(self, stage: str, **labels) -> Iterator[dict]:
+        """Time a block as `stage`; yields a dict whose keys are added to the log line.
+
+        Failed blocks are recorded too, with status="error".
+        """
+        fields: dict = {}
+        status = "ok"
+        began = time.perf_counter()
+        try:
+            yield fields
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - began, status, fields, **labels)
+
+    def record(self, stage: str, seconds: float, status: str = "ok", fields: Optional[dict] = None, **labels):
+        """Record a stage timing measured by the caller (e.g. one that spans yields)."""
+        self.observe("stage_seconds", seconds, stage=stage, **labels)
+        if status == "error":
+            self.inc("stage_errors_total", stage=stage, **labels)
+        if self._log_path:
+            self.log(dict(fields or {}, event="span", stage=stage, seconds=round(seconds, 6), status=status, **labels))
+
+    def log(self, record: dict):
+        """Append a JSON line to the metrics log (no-op when logging is off)."""
+        if not self._log_path:
+            return
+        line = json.dumps(dict(record, ts=round(time.time(), 3)), ensure_ascii=False, default=str)
+        with self._log_lock:
+            try:
+                if self._log_path == "-":
+                    print(line, file=sys.stdout, flush=True)
+                else:
+                    with open(self._log_path, "a", encoding="utf-8") as f:
+                        f.write(line + "\n")
+            except OSError:
+                # Metrics must never break a request
+                pass
+
+    def register_collector(self, name: str, collect: Callable[[], Optional[Dict[str, float]]]):
+        """Call `collect` at scrape time for gauges ({metric name: value}).
+
+        Bound methods are held weakly, so a retired engine's collector goes
+        away with it; registering the same name again replaces the old one.
+        """
+        if hasattr(collect, "__self__"):
+            method = weakref.WeakMethod(collect)
+
+            def collect():
+                bound = method()
+                return bound() if bound is not None else None
+        with self._lock:
+            self._collectors[name] = collect
+
+    # -- reading ---------------------------------------------------------
+
+    def _gauges(self) -> Dict[str, float]:
+        with self._lock:
+            collectors = list(self._collectors.values())
+        gauges: Dict[str, float] = {}
+        for collect in collectors:
+            try:
+                gauges.update(collect() or {})
+            except Exception:
+                continue
+        return gauges
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def snapshot(self) -> dict:
+        """All metrics as plain data: histograms with count/sum/p50/p95/p99."""
+        with self._lock:
+            histograms = {}
+            for (name, labels), histogram in self._histograms.items():
+                entry = {"count": histogram.count, "sum": histogram.total}
+                entry.update({f"p{int(q * 100)}": value for q, value in histogram.quantiles().items()})
+                histograms.setdefault(name, []).append(dict(labels=dict(labels), **entry))
+            counters = {}
+            for (name, labels), value in self._counters.items():
+                counters.setdefault(name, []).append({"labels": dict(labels), "value": value})
+        return {"histograms": histograms, "counters": counters, "gauges": self._gauges()}
+
+    def render_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            families: Dict[str, list] = {}
+            for (name, labels), histogram in sorted(self._histograms.items()):
+                families.setdefault(name, []).append((labels, histogram.count, histogram.total,
+                                                      histogram.quantiles()))
+            counters = sorted(self._counters.items())
+
+        for name, series in families.items():
+            metric = PREFIX + name
+            if name in self._help:
+                lines.append(f"# HELP {metric} {self._help[name]}")
+            lines.append(f"# TYPE {metric} summary")
+            for labels, count, total, quantiles in series:
+                for q, value in quantiles.items():
+                    lines.append(f"{metric}{_format_labels(labels, ('quantile', str(q)))} {value:.6g}")
+                lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6g}")
+                lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+
+        typed = set()
+        for (name, labels), value in counters:
+            metric = PREFIX + name
+            if metric not in typed:
+                typed.add(metric)
+                if name in self._help:
+                    lines.append(f"# HELP {metric} {self._help[name]}")
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_format_labels(labels)} {value:g}")
+
+        for name, value in sorted(self._gauges().items()):
+            metric = PREFIX + name
+            if name in self._help:
+                lines.append(f"# HELP {metric} {self._help[name]}")
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value:.6g}")
+        return "\n".join(lines) + "\n"
+
+    # -- endpoint --------------------------------------------------------
+
+    def serve(self, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        """Serve /metrics on a daemon thread (idempotent per process)."""
+        if self._server is not None:
+            return self._server
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        return self._server
+
+
+metrics = Metrics(log_path=os.getenv("RAG_METRICS_LOG") or None)
+metrics.describe("stage_seconds", "Time spent in each request/indexing stage, in seconds.")
+metrics.describe("stage_errors_total", "Stage executions that raised.")
+metrics.describe("prompt_tokens", "Tokens in each answer prompt.")
+metrics.describe("queries_total", "Answered queries by outcome (generated, cached, coalesced, prewarmed, fallback, error; warmup for warm-up jobs).")
+metrics.describe("knowledge_gaps_total", "Queries the knowledge base could not answer.")
+metrics.describe("tts_failures_total", "Narration segments that produced no audio.")
+metrics.describe("single_flight_total", "Coalescable calls, by whether they led the work or shared it.")
+metrics.describe("llm_retries_total", "Model calls retried after a transient error.")
+metrics.describe("llm_hedges_total", "Duplicate model requests sent because the first was slow.")
+metrics.describe("llm_hedge_wins_total", "Hedged requests that answered first.")
+metrics.describe("llm_circuit_opens_total", "Times the model circuit breaker opened.")
+metrics.describe("llm_circuit_open", "1 while model calls are short-circuited to fallback answers.")
+
+_serve_lock = threading.Lock()
+# (host, port) that could not be bound; not retried on every rerun
+_serve_failed: Optional[Tuple[str, int]] = None
+
+
+def start_metrics_server() -> Optional[ThreadingHTTPServer]:
+    """Start the /metrics endpoint if RAG_METRICS_PORT is set (safe to call repeatedly).
+
+    Binds RAG_METRICS_HOST (default 127.0.0.1). If the address cannot be
+    bound, later calls return None without trying it again.
+    """
+    global _serve_failed
+    port = int(os.getenv("RAG_METRICS_PORT", "0"))
+    if not port:
+        return None
+    host = os.getenv("RAG_METRICS_HOST", "127.0.0.1")
+    with _serve_lock:
+        if _serve_failed == (host, port):
+            return None
+        try:
+            return metrics.serve(port, host)
+        except OSError as e:
+            # Another process (e.g. a second Streamlit worker) owns the port
+            _serve_failed = (host, port)
+            logger.warning("Metrics endpoint not started on %s:%d: %s", host, port, e)
+            return None
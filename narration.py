@@ -0,0 +1,238 @@
+"""
+Narration Pipeline - Overlap voice-script generation with text-to-speech
+
+Before, narration ran three blocking steps back to back: write the whole
+script, then synthesize it, then play it. Here the stages run concurrently:
+
+    script sentences  ->  TTS workers  ->  ordered audio segments
+
+A producer thread pulls sentences from the script generator and hands each
+one to a small TTS pool the moment it is complete. The caller iterates the
+pipeline and receives (sentence, audio) pairs in script order as soon as
+each segment is ready, so total latency is bounded by the slowest stage
+rather than the sum of all of them.
+"""
+
+import logging
+import queue
+import re
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+# Whitespace that follows sentence-ending punctuation
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+# Tags used by the single-pass answer + narration prompt (tolerant of case/spacing)
+_ANSWER_TAG = re.compile(r"<\s*/?\s*answer\s*>", re.IGNORECASE)
+_NARRATION_OPEN = re.compile(r"<\s*narration\s*>", re.IGNORECASE)
+_NARRATION_CLOSE = re.compile(r"<\s*/\s*narration\s*>.*", re.IGNORECASE | re.DOTALL)
+
+COMBINED_OUTPUT_FORMAT = """Respond in exactly this format:
+<answer>
+(your answer)
+</answer>
+<narration>
+(a friendly, casual, encouraging audio script summarizing your answer in under 2 sentences)
+</narration>"""
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into non-empty sentences."""
+    return [sentence.strip() for sentence in SENTENCE_BREAK.split(text) if sentence.strip()]
+
+
+def parse_combined_output(text: str) -> Tuple[str, str]:
+    """Split single-pass model output into (answer, narration).
+
+    Missing or unclosed tags are tolerated: without a <narration> block the
+    whole text is the answer and the narration is empty.
+    """
+    match = _NARRATION_OPEN.search(text)
+    if match:
+        answer_part, narration = text[:match.start()], text[match.end():]
+        narration = _NARRATION_CLOSE.sub("", narration)
+    else:
+        answer_part, narration = text, ""
+    answer = _ANSWER_TAG.sub("", answer_part).strip()
+    return answer, narration.strip().replace('"', '')
+
+
+class CombinedStreamParser:
+    """Incrementally separates the answer from the narration in streamed output.
+
+    feed() returns only answer text that is safe to show: anything after
+    "<narration>" is withheld, and a trailing "<" that may start a tag is
+    held back until the next delta shows what it is.
+    """
+
+    _HOLD_BACK = 16
+
+    def __init__(self):
+        self.raw = ""
+        self._pending = ""
+        self._in_narration = False
+        self._started = False
+
+    def feed(self, text: str) -> str:
+        self.raw += text
+        if self._in_narration:
+            return ""
+
+        self._pending += text
+        match = _NARRATION_OPEN.search(self._pending)
+        if match:
+            emit, self._pending = self._pending[:match.start()], ""
+            self._in_narration = True
+        else:
+            cut = self._pending.rfind("<")
+            if cut != -1 and len(self._pending) - cut < self._HOLD_BACK and ">" not in self._pending[cut:]:
+                emit, self._pending = self._pending[:cut], self._pending[cut:]
+            else:
+                emit, self._pending = self._pending, ""
+
+        emit = _ANSWER_TAG.sub("", emit)
+        if not self._started:
+            emit = emit.lstrip()
+            self._started = bool(emit)
+        return emit
+
+    def finish(self) -> Tuple[str, str]:
+        """Return the final (answer, narration) parsed from everything fed."""
+        return parse_combined_output(self.raw)
+
+
+def extractive_summary(text: str, max_sentences: int = 2, max_chars: int = 300) -> str:
+    """Pick the most representative sentences of an answer, with no LLM call.
+
+    Sentences are scored by the frequency of their (stemmed) terms across
+    the whole text, with a bonus for the opening sentence and a penalty for
+    questions, and returned in their original order.
+    """
+    # Drop code blocks and markdown decoration that would read badly aloud
+    plain = re.sub(r"```.*?```", " ", text, flags=re.DOTALL)
+    plain = re.sub(r"^\s*#+[^\n.!?]*$", "", plain, flags=re.MULTILINE)
+    plain = re.sub(r"\[([^\]]*)\]\([^)]*\)", r"\1", plain)
+    plain = re.sub(r"[*_`#>|]+", "", plain)
+    plain = re.sub(r"^\s*(?:[-•]|\d+\.)\s+", "", plain, flags=re.MULTILINE)
+
+    sentences = [s for line in plain.splitlines() for s in split_sentences(line)]
+    if not sentences:
+        return ""
+    if len(sentences) > max_sentences:
+        freq = Counter(tokenize(plain))
+        scored = []
+        for position, sentence in enumerate(sentences):
+            terms = set(tokenize(sentence))
+            score = sum(freq[t] for t in terms) / (len(terms) ** 0.5 or 1)
+            if position == 0:
+                score *= 1.5
+            if sentence.endswith("?"):
+                # Questions (often FAQ headings) make poor narration
+                score *= 0.25
+            scored.append((score, position))
+        keep = sorted(position for _, position in sorted(scored, reverse=True)[:max_sentences])
+        sentences = [sentences[position] for position in keep]
+
+    summary = re.sub(r"\s+", " ", " ".join(sentences))
+    if len(summary) > max_chars:
+        summary = summary[:max_chars].rsplit(" ", 1)[0] + "..."
+    return summary
+
+
+class NarrationPipeline:
+    """Pipelines script sentences through TTS, yielding audio segments in order."""
+
+    def __init__(self, sentences: Iterable[str],
+                 synthesize: Callable[[str], Optional[bytes]],
+                 tts_workers: int = 2, max_pending: int = 4):
+        """
+        Args:
+            sentences: Script sentences, typically a streaming generator.
+            synthesize: Text-to-speech function returning audio bytes (or None).
+            tts_workers: Concurrent TTS requests.
+            max_pending: Sentences allowed in flight before the producer waits.
+        """
+        self.sentences = sentences
+        self.synthesize = synthesize
+        self.tts_workers = tts_workers
+        self._futures: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._stop = threading.Event()
+
+    def _put(self, item) -> bool:
+        # Bounded put that gives up if the consumer has stopped listening
+        while not self._stop.is_set():
+            try:
+                self._futures.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, pool: ThreadPoolExecutor):
+        try:
+            for sentence in self.sentences:
+                future = pool.submit(self._synthesize_safely, sentence)
+                if not self._put((sentence, future)):
+                    return
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._put(_DONE)
+
+    def _synthesize_safely(self, sentence: str) -> Optional[bytes]:
+        # One failed segment shouldn't silence the rest of the narration
+        try:
+            return self.synthesize(sentence)
+        except Exception as e:
+            logger.warning("Voice error: %s", e)
+            return None
+
+    def __iter__(self) -> Iterator[Tuple[str, Optional[bytes]]]:
+        pool = ThreadPoolExecutor(max_workers=self.tts_workers, thread_name_prefix="narration-tts")
+        producer = threading.Thread(target=self._produce, args=(pool,), name="narration-script", daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = self._futures.get()
+                if item is _DONE:
+                    break
+                sentence, future = item
+                yield sentence, future.result()
+        finally:
+            # No join: the producer may be blocked on the script stream until
+            # its next sentence; with _stop set it exits on its own (daemon)
+            self._stop.set()
+            pool.shutdown(wait=False)
+
+        # Reached only once _DONE arrived, so the producer has recorded any error
+        if self._error is not None:
+            logger.warning("Voice script error: %s", self._error)
+
+
+def narrate(answer: str, narration: str, summarize: Callable[[str], Iterable[str]],
+            synthesize: Callable[[str], Optional[bytes]], key=None) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """(sentence, audio) pairs narrating an answer.
+
+    The script is `narration` when the answer came with one; otherwise
+    `summarize(answer)` writes it (streamed sentence by sentence). With a
+    `key`, concurrent calls for the same answer share one script and one
+    set of TTS calls (see single_flight.py).
+    """
+    def pipeline():
+        script = iter(split_sentences(narration)) if narration else summarize(answer)
+        return NarrationPipeline(script, synthesize)
+
+    if key is None:
+        return iter(pipeline())
+    from single_flight import get_flight
+    pairs, _ = get_flight("narration").stream((key, answer), pipeline)
+    return pairs
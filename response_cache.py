@@ -0,0 +1,207 @@
+"""
+Response Cache - Exact-match answer cache for RAGEngine.query
+
+Two tiers:
+- memory: LRU with a TTL, per engine; a hit costs a dict lookup
+- disk (optional): a SQLite file shared by every app process on the host
+
+The key covers everything that shapes an answer: the normalized question,
+the mode prompt (context_prefix), the retrieved chunk ids and content
+hashes, the model id and the generation params. When a document changes,
+its chunks get new ids/hashes, so entries built on them are simply never
+looked up again and age out.
+
+To skip retrieval on repeat questions, a query can also be linked to its
+full key under an alias that includes the index snapshot version. Any
+index update bumps the version, which invalidates every alias at once.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", query.strip().lower()).rstrip("?!. ")
+
+
+def _digest(parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """LRU + TTL answer cache with an optional shared SQLite tier."""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._aliases: "OrderedDict[str, str]" = OrderedDict()    # alias -> key
+        self._local = threading.local()
+
+        self.hits = 0
+        self.misses = 0
+
+        if db_path:
+            self._connection().execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    # -- keys ------------------------------------------------------------
+
+    @staticmethod
+    def make_key(query: str, context_prefix: str, chunks: List[dict], model_id: str, params: dict) -> str:
+        """Full cache key for an answer built from these chunks."""
+        return _digest({
+            "query": normalize_query(query),
+            "prefix": context_prefix,
+            "chunks": [
+                [chunk.get("id"), hashlib.sha1(chunk["content"].encode("utf-8")).hexdigest()]
+                for chunk in chunks
+            ],
+            "model": model_id,
+            "params": params
+        })
+
+    @staticmethod
+    def make_alias(query: str, context_prefix: str, index_version: int, model_id: str, params: dict) -> str:
+        """Retrieval-free lookup key; valid only for one index snapshot."""
+        return _digest({
+            "query": normalize_query(query),
+            "prefix": context_prefix,
+            "index": index_version,
+            "model": model_id,
+            "params": params
+        })
+
+    # -- lookups ---------------------------------------------------------
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return a copy of the cached response, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._copy(entry[1])
+                del self._entries[key]
+
+        value = self._db_get(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._store(key, value, now + self.ttl_seconds)
+        return self._copy(value)
+
+    def get_alias(self, alias: str) -> Optional[dict]:
+        """Return the response linked to an alias, without counting a miss."""
+        with self._lock:
+            key = self._aliases.get(alias)
+            if key is None:
+                return None
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                return None
+            self._aliases.move_to_end(alias)
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._copy(entry[1])
+
+    def put(self, key: str, value: dict, alias: Optional[str] = None):
+        """Store a response (and optionally link an alias to it)."""
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store(key, value, expires_at)
+            if alias:
+                self.link(alias, key, locked=True)
+        self._db_put(key, value, expires_at)
+
+    def link(self, alias: str, key: str, locked: bool = False):
+        """Point an alias at an existing key."""
+        if not locked:
+            with self._lock:
+                return self.link(alias, key, locked=True)
+        self._aliases[alias] = key
+        self._aliases.move_to_end(alias)
+        while len(self._aliases) > self.max_entries:
+            self._aliases.popitem(last=False)
+
+    def clear(self):
+        """Drop the in-memory tier (the disk tier keeps its own TTL)."""
+        with self._lock:
+            self._entries.clear()
+            self._aliases.clear()
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def _store(self, key: str, value: dict, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _copy(value: dict) -> dict:
+        result = dict(value)
+        result["sources"] = [dict(source) for source in value.get("sources", [])]
+        result["cached"] = True
+        return result
+
+    # -- disk tier -------------------------------------------------------
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads; keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _db_get(self, key: str, now: float) -> Optional[dict]:
+        if not self.db_path:
+            return None
+        try:
+            row = self._connection().execute(
+                "SELECT value FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        return json.loads(row[0]) if row else None
+
+    def _db_put(self, key: str, value: dict, expires_at: float):
+        if not self.db_path:
+            return
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+            conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+            # Keep the shared tier bounded too: drop the entries closest to expiry
+            conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses"
+                " ORDER BY expires_at DESC LIMIT -1 OFFSET ?)", (self.max_entries * 10,)
+            )
+        except sqlite3.Error:
+            pass
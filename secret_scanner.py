@@ -0,0 +1,185 @@
+"""
+Secret Scanner - Fast multi-rule secret detection for ingested documents
+
+Rules are plain dicts ({"id", "pattern", "description", "keywords"}) loaded
+from a JSON file (RAG_SECRET_RULES) or taken from DEFAULT_RULES, and compiled
+once per process.
+
+One alternation regex of all rules is the obvious design, but Python's re
+loses its literal-prefix fast path on alternations and falls back to trying
+every branch at every position, an order of magnitude slower than separate
+searches (see benchmarks/bench_secrets.py). Instead, each
+rule is anchored on the literal text its matches start with ("AKIA",
+"-----BEGIN "), either listed as `keywords` or derived from the pattern.
+Anchors are located with str.find / mmap.find (C-speed substring search), and
+the rule's regex only runs at those positions. Rules without a usable anchor
+fall back to a regular search.
+
+Files above `mmap_threshold` bytes are scanned through mmap with the bytes
+versions of the rules, so large files are never decoded or held in memory.
+Ingestion in "reject" mode scans each file this way (scan_file) before
+reading it; "redact" mode needs the text and scans it in memory.
+"""
+
+import hashlib
+import json
+import mmap
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+DEFAULT_RULES = [
+    {"id": "aws-access-key", "pattern": r"(?:AKIA|ASIA)[0-9A-Z]{16}",
+     "keywords": ["AKIA", "ASIA"], "description": "AWS access key id"},
+    {"id": "private-key", "pattern": r"-----BEGIN (?:[A-Z]+ )?PRIVATE KEY-----",
+     "description": "PEM private key"},
+    {"id": "github-token", "pattern": r"gh[pousr]_[a-zA-Z0-9]{36}",
+     "keywords": ["gh"], "description": "GitHub token"},
+    {"id": "github-fine-grained-token", "pattern": r"github_pat_[a-zA-Z0-9_]{82}",
+     "description": "GitHub fine-grained personal access token"},
+    {"id": "slack-token", "pattern": r"xox[abprs]-[0-9A-Za-z-]{10,}", "description": "Slack token"},
+    {"id": "google-api-key", "pattern": r"AIza[0-9A-Za-z_\-]{35}", "description": "Google API key"},
+    {"id": "stripe-live-key", "pattern": r"[sr]k_live_[0-9a-zA-Z]{24,}",
+     "keywords": ["sk_live_", "rk_live_"], "description": "Stripe live secret key"},
+]
+
+# Each anchor costs one pass over the text, so rules share short anchors
+# ("gh") where they can; a single character matches too often to help
+MIN_ANCHOR = 2
+_REGEX_META = set(".^$*+?{}[]\\|()")
+
+
+def load_rules(path: Optional[str] = None) -> List[dict]:
+    """Rules from a JSON file (a list of rule dicts), or DEFAULT_RULES."""
+    if not path:
+        return [dict(rule) for rule in DEFAULT_RULES]
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    for rule in rules:
+        if "id" not in rule or "pattern" not in rule:
+            raise ValueError(f"Secret rule needs an id and a pattern: {rule}")
+    return rules
+
+
+def rules_fingerprint(rules: Sequence[dict]) -> str:
+    """Short hash of the rule patterns, to tell when a rule set has changed."""
+    spec = json.dumps([[rule["id"], rule["pattern"]] for rule in rules], sort_keys=True)
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()[:16]
+
+
+def literal_prefix(pattern: str) -> str:
+    """The literal text every match of `pattern` starts with (may be empty)."""
+    prefix = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            if i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+                prefix.append(pattern[i + 1])
+                i += 2
+                continue
+            break
+        if char in _REGEX_META:
+            break
+        prefix.append(char)
+        i += 1
+    # A quantifier applies to the character before it, which is then optional
+    if i < len(pattern) and pattern[i] in "*?{" and prefix:
+        prefix.pop()
+    # A top-level alternation means matches don't share this prefix at all
+    if "|" in pattern and not pattern.startswith("(?:"):
+        depth = 0
+        for j, char in enumerate(pattern):
+            if char == "\\":
+                continue
+            if char in "([":
+                depth += 1
+            elif char in ")]":
+                depth -= 1
+            elif char == "|" and depth == 0 and (j == 0 or pattern[j - 1] != "\\"):
+                return ""
+    return "".join(prefix)
+
+
+class SecretScanner:
+    """Scans text or files against a compiled rule set."""
+
+    def __init__(self, rules: Optional[Sequence[dict]] = None, mmap_threshold: int = 8 * 1024 * 1024):
+        self.rules = list(rules) if rules is not None else load_rules()
+        self.mmap_threshold = mmap_threshold
+
+        # anchor -> [(rule id, compiled str regex, compiled bytes regex)]
+        self._anchored: Dict[str, List[tuple]] = {}
+        self._unanchored: List[tuple] = []
+        for rule in self.rules:
+            compiled = (rule["id"], re.compile(rule["pattern"]), re.compile(rule["pattern"].encode("utf-8")))
+            anchors = rule.get("keywords") or [literal_prefix(rule["pattern"])]
+            if all(len(anchor) >= MIN_ANCHOR for anchor in anchors):
+                for anchor in anchors:
+                    self._anchored.setdefault(anchor, []).append(compiled)
+            else:
+                self._unanchored.append(compiled)
+
+    # -- scanning --------------------------------------------------------
+
+    def finditer(self, data: Union[str, bytes, mmap.mmap]) -> Iterator[Tuple[str, int, int]]:
+        """Yield (rule id, start, end) for every match, grouped by anchor."""
+        is_text = isinstance(data, str)
+        for anchor, compiled_rules in self._anchored.items():
+            needle = anchor if is_text else anchor.encode("utf-8")
+            pos = data.find(needle)
+            while pos != -1:
+                for rule_id, text_regex, bytes_regex in compiled_rules:
+                    match = (text_regex if is_text else bytes_regex).match(data, pos)
+                    if match:
+                        yield rule_id, match.start(), match.end()
+                        break
+                pos = data.find(needle, pos + 1)
+        for rule_id, text_regex, bytes_regex in self._unanchored:
+            for match in (text_regex if is_text else bytes_regex).finditer(data):
+                yield rule_id, match.start(), match.end()
+
+    def scan(self, data: Union[str, bytes, mmap.mmap]) -> Counter:
+        """Hit counts per rule id (empty if clean)."""
+        return Counter(rule_id for rule_id, _, _ in self.finditer(data))
+
+    def scan_file(self, path: Union[str, Path]) -> Counter:
+        """Hit counts for a file; large files are memory-mapped, not read."""
+        path = Path(path)
+        size = path.stat().st_size
+        if size == 0:
+            return Counter()
+        if size < self.mmap_threshold:
+            return self.scan(path.read_bytes())
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return self.scan(mapped)
+
+    def redact(self, text: str, template: str = "[REDACTED:{rule}]") -> Tuple[str, Counter]:
+        """Replace every match with a placeholder; returns (text, hits per rule)."""
+        spans = sorted(self.finditer(text), key=lambda hit: hit[1])
+        if not spans:
+            return text, Counter()
+        parts = []
+        last = 0
+        for rule_id, start, end in spans:
+            if start < last:
+                # Overlapping matches: the earlier one already covers this text
+                continue
+            parts.append(text[last:start])
+            parts.append(template.format(rule=rule_id))
+            last = end
+        parts.append(text[last:])
+        return "".join(parts), Counter(rule_id for rule_id, _, _ in spans)
+
+
+_scanners: Dict[str, SecretScanner] = {}
+
+
+def get_scanner(rules_path: Optional[str] = None) -> SecretScanner:
+    """Per-process scanner for a rules file (compiled on first use)."""
+    key = rules_path or ""
+    scanner = _scanners.get(key)
+    if scanner is None:
+        scanner = _scanners[key] = SecretScanner(load_rules(rules_path))
+    return scanner
@@ -0,0 +1,144 @@
+"""
+Semantic Cache - Reuse answers for differently worded versions of a question
+
+"how do I set up my env" and "dev environment setup" miss the exact cache
+but land close together in embedding space. This cache keeps the
+embeddings of previously answered queries in one matrix; a lookup is a
+single matrix-vector product against the rows for the same mode and
+answer settings. A stored answer is reused only when it was produced with
+the same settings (narration mode, context budget, generation params: the
+same ones the exact cache keys on), similarity clears the threshold and
+every source chunk it was built from is still in the live index.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def params_fingerprint(params: Optional[dict]) -> str:
+    """Stable digest of the settings an answer was generated with."""
+    payload = json.dumps(params or {}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class SemanticCache:
+    """Bounded nearest-neighbour cache of answered queries with LRU eviction."""
+
+    def __init__(self, embed: Callable[[List[str]], np.ndarray], dimension: int,
+                 threshold: float = 0.9, max_entries: int = 256):
+        """
+        Args:
+            embed: Function mapping texts to unit-length float32 rows.
+            dimension: Embedding size.
+            threshold: Minimum cosine similarity for a hit.
+            max_entries: Entries kept before the least recently used is evicted.
+        """
+        self.embed = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._vectors = np.zeros((max_entries, dimension), dtype=np.float32)
+        self._slots: List[Optional[dict]] = [None] * max_entries
+        self._free = list(range(max_entries - 1, -1, -1))
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return self.max_entries - len(self._free)
+
+    def lookup(self, query: str, context_prefix: str, live_chunks: Dict[str, dict],
+               vector: Optional[np.ndarray] = None, params: Optional[dict] = None) -> Optional[dict]:
+        """Return a copy of the closest stored answer for this mode and settings, or None.
+
+        Args:
+            live_chunks: id -> chunk map of the current index; answers whose
+                sources are no longer all present are dropped.
+            vector: The query embedding, if the caller already has it.
+            params: Answer settings; only answers stored with equal params match.
+        """
+        if vector is None:
+            vector = self.embed([query])[0]
+        key = (context_prefix, params_fingerprint(params))
+        with self._lock:
+            candidates = [i for i, entry in enumerate(self._slots)
+                          if entry is not None and entry["key"] == key]
+            if not candidates:
+                self.misses += 1
+                return None
+
+            scores = self._vectors[candidates] @ vector
+            best = int(np.argmax(scores))
+            slot, similarity = candidates[best], float(scores[best])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = self._slots[slot]
+            if not all(cid in live_chunks for cid in entry["source_ids"]):
+                # Built on chunks that were edited or deleted since
+                self._release(slot)
+                self.stale += 1
+                self.misses += 1
+                return None
+
+            entry["last_used"] = time.monotonic()
+            self.hits += 1
+            result = {
+                "answer": entry["answer"],
+                "sources": [dict(source) for source in entry["sources"]],
+                "cached": True,
+                "semantic_match": {"query": entry["query"], "similarity": round(similarity, 4)}
+            }
+            if entry["narration"]:
+                result["narration"] = entry["narration"]
+            return result
+
+    def add(self, query: str, context_prefix: str, response: dict, vector: Optional[np.ndarray] = None,
+            params: Optional[dict] = None):
+        """Remember an answered query, generated with answer settings `params`."""
+        sources = response.get("sources", [])
+        if not sources:
+            return
+        if vector is None:
+            vector = self.embed([query])[0]
+        with self._lock:
+            if not self._free:
+                lru = min(range(self.max_entries), key=lambda i: self._slots[i]["last_used"])
+                self._release(lru)
+                self.evictions += 1
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._slots[slot] = {
+                "query": query,
+                "key": (context_prefix, params_fingerprint(params)),
+                "answer": response["answer"],
+                "narration": response.get("narration", ""),
+                "sources": [dict(source) for source in sources],
+                "source_ids": [source.get("id") for source in sources],
+                "last_used": time.monotonic()
+            }
+
+    def _release(self, slot: int):
+        self._slots[slot] = None
+        self._free.append(slot)
+
+    def stats(self) -> dict:
+        """Hit/miss counters for dashboards."""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / total if total else 0.0
+        }
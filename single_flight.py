@@ -0,0 +1,147 @@
+"""
+Single Flight - Coalesce identical requests that are in flight at the same time
+
+When an announcement sends the whole team to the same quick-topic button,
+every click would otherwise run its own retrieval, generation and TTS. With
+single flight, the first caller for a key does the work and every identical
+caller that arrives while it is running shares the outcome:
+
+    result, shared = flight.do(key, lambda: expensive(...))
+
+    events, shared = flight.stream(key, lambda: generate_events(...))
+    for event in events:
+        ...
+
+do() hands every caller the same result (or raises the same exception).
+stream() runs the producer to completion on its own thread and replays its
+items to each caller from the start, so late joiners see the whole stream
+and a caller that stops reading (a Streamlit rerun) never cuts it short for
+the others.
+
+Nothing is kept once a call finishes; repeats after that are the caches' job.
+"""
+
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+from metrics import metrics
+
+
+class _Broadcast:
+    """Items of one producer, replayable by any number of readers."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+    def append(self, item):
+        with self._cond:
+            self.items.append(item)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self) -> Iterator[Any]:
+        position = 0
+        while True:
+            with self._cond:
+                while position >= len(self.items) and not self.done:
+                    self._cond.wait()
+                items = self.items[position:]
+                done, error = self.done, self.error
+            position += len(items)
+            yield from items
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class SingleFlight:
+    """Per-key coalescing of concurrent calls (thread-safe)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls) + len(self._streams)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Run `fn` once per key at a time; returns (result, shared)."""
+        with self._lock:
+            future = self._calls.get(key)
+            shared = future is not None
+            if not shared:
+                future = self._calls[key] = Future()
+        self._count(shared)
+        if shared:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+        return result, False
+
+    def stream(self, key: Hashable, produce: Callable[[], Iterable[Any]]) -> Tuple[Iterator[Any], bool]:
+        """Share one run of `produce()` per key; returns (items, shared)."""
+        with self._lock:
+            broadcast = self._streams.get(key)
+            shared = broadcast is not None
+            if not shared:
+                broadcast = self._streams[key] = _Broadcast()
+        self._count(shared)
+        if not shared:
+            threading.Thread(
+                target=self._drain, args=(key, broadcast, produce),
+                name=f"single-flight-{self.name}", daemon=True
+            ).start()
+        return broadcast.follow(), shared
+
+    def _drain(self, key: Hashable, broadcast: _Broadcast, produce: Callable[[], Iterable[Any]]):
+        error = None
+        try:
+            for item in produce():
+                broadcast.append(item)
+        except BaseException as e:
+            error = e
+        finally:
+            # Callers arriving from here on start a fresh flight
+            with self._lock:
+                if self._streams.get(key) is broadcast:
+                    del self._streams[key]
+            broadcast.finish(error)
+
+    def _count(self, shared: bool):
+        metrics.inc("single_flight_total", flight=self.name, role="shared" if shared else "leader")
+
+
+_flights: Dict[str, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name: str) -> SingleFlight:
+    """Process-wide SingleFlight for `name` (one per kind of work)."""
+    with _flights_lock:
+        flight = _flights.get(name)
+        if flight is None:
+            flight = _flights[name] = SingleFlight(name)
+        return flight
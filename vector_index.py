@@ -0,0 +1,300 @@
+"""
+Vector Index - Exact top-k search over a memory-mapped NumPy embedding matrix
+
+An alternative to ChromaDB's HNSW collection for small and medium corpora.
+All chunk embeddings live in one contiguous, L2-normalised float32 (or
+float16) matrix stored as a .npy file and opened with mmap_mode="r", so
+several worker processes share the same read-only pages through the OS page
+cache. A search is one matrix-vector product plus argpartition; a batch of
+queries is one matrix-matrix product.
+
+Every write produces a new matrix file, so loads wrap their batches in
+bulk(): rows are buffered in memory and the matrix is written once.
+
+On-disk layout (inside the index directory):
+    vectors/meta.json            ids, dtype, dimension, current matrix file
+    vectors/embeddings-<id>.npy  the matrix; replaced, never modified in place
+"""
+
+import json
+import os
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Rows scored per block when the matrix is float16 (upcast block by block
+# instead of materialising a float32 copy of the whole matrix)
+_BLOCK_ROWS = 65536
+
+
+class _State:
+    """One immutable (ids, matrix) pair; swapped as a whole on every write."""
+
+    def __init__(self, ids: List[str], matrix: np.ndarray, filename: Optional[str] = None):
+        self.ids = ids
+        self.matrix = matrix
+        self.filename = filename
+        self.row_of = {cid: row for row, cid in enumerate(ids)}
+
+
+class _Pending:
+    """Rows added inside a bulk() block, in a buffer that doubles as it fills."""
+
+    def __init__(self, dimension: int, dtype: np.dtype):
+        self.ids: List[str] = []
+        self.row_of: Dict[str, int] = {}
+        self._rows = np.empty((0, dimension), dtype=dtype)
+
+    def extend(self, ids: List[str], vectors: np.ndarray):
+        needed = len(self.ids) + len(ids)
+        if needed > len(self._rows):
+            grown = np.empty((max(needed, 2 * len(self._rows), 1024), self._rows.shape[1]), dtype=self._rows.dtype)
+            grown[:len(self.ids)] = self._rows[:len(self.ids)]
+            self._rows = grown
+        for cid, vector in zip(ids, vectors):
+            row = self.row_of.get(cid)
+            if row is None:
+                row = self.row_of[cid] = len(self.ids)
+                self.ids.append(cid)
+            self._rows[row] = vector
+
+    def matrix(self) -> np.ndarray:
+        return self._rows[:len(self.ids)]
+
+
+class NumpyVectorIndex:
+    """Exact cosine-similarity search over a memory-mapped embedding matrix."""
+
+    def __init__(self, embed: Callable[[List[str]], np.ndarray], dimension: int,
+                 directory: Optional[str] = None, dtype: str = "float32",
+                 compact_ratio: float = 0.25):
+        """
+        Args:
+            embed: Function mapping texts to unit-length float32 rows.
+            dimension: Embedding size.
+            directory: Where to persist the matrix; None keeps it in RAM.
+            dtype: "float32" or "float16" storage (queries always score in float32).
+            compact_ratio: Rewrite the matrix once this fraction of rows is deleted.
+        """
+        if dtype not in ("float32", "float16"):
+            raise ValueError("dtype must be float32 or float16")
+        self.embed = embed
+        self.dimension = dimension
+        self.directory = Path(directory) if directory else None
+        self.dtype = np.dtype(dtype)
+        self.compact_ratio = compact_ratio
+
+        self._write_lock = threading.Lock()
+        self._pending: Optional[_Pending] = None
+        self._dead = set()
+        self._mask_cache: Tuple[Optional[int], Optional[np.ndarray]] = (None, None)
+        self._state = _State([], np.zeros((0, dimension), dtype=self.dtype))
+
+        if self.directory:
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._state.ids) - len(self._dead)
+
+    # -- persistence -----------------------------------------------------
+
+    def _load(self):
+        meta_path = self.directory / "meta.json"
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["dimension"] != self.dimension or meta["dtype"] != self.dtype.name:
+                return
+            matrix = np.load(self.directory / meta["file"], mmap_mode="r")
+        except (OSError, ValueError, KeyError):
+            return
+        if matrix.shape != (len(meta["ids"]), self.dimension):
+            return
+        self._state = _State(meta["ids"], matrix, meta["file"])
+        self._dead = set(meta.get("dead", []))
+
+    def _write(self, ids: List[str], matrix: np.ndarray) -> _State:
+        """Persist a new matrix and return its state (memory-mapped if on disk)."""
+        if not self.directory:
+            return _State(ids, matrix)
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        filename = f"embeddings-{uuid.uuid4().hex[:12]}.npy"
+        np.save(self.directory / filename, matrix)
+
+        state = _State(ids, np.load(self.directory / filename, mmap_mode="r"), filename)
+        self._write_meta(state, set())
+        return state
+
+    def _write_meta(self, state: _State, dead: set):
+        """Atomically point meta.json at a matrix file (and record masked rows)."""
+        if not self.directory:
+            return
+        meta = {
+            "file": state.filename,
+            "ids": state.ids,
+            "dead": sorted(dead),
+            "dtype": self.dtype.name,
+            "dimension": self.dimension
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".meta-", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.directory / "meta.json")
+
+    def _swap(self, state: _State):
+        previous = self._state
+        self._state = state
+        self._mask_cache = (None, None)
+        if previous.filename and previous.filename != state.filename:
+            # Readers still holding the old mapping keep a valid view on POSIX;
+            # on Windows the unlink fails while mapped and the file is left behind
+            try:
+                os.unlink(self.directory / previous.filename)
+            except OSError:
+                pass
+
+    # -- writes ----------------------------------------------------------
+
+    def reset(self):
+        """Drop every vector."""
+        with self._write_lock:
+            self._dead.clear()
+            self._swap(self._write([], np.zeros((0, self.dimension), dtype=self.dtype)))
+
+    @contextmanager
+    def bulk(self):
+        """Buffer add() calls inside the block and write the matrix once at the end.
+
+        Rows go into a growable in-memory buffer, so loading N chunks in
+        batches costs one write instead of one full rewrite per batch.
+        Nothing is visible to searches until the block ends; if it raises,
+        the buffered rows are dropped.
+        """
+        with self._write_lock:
+            outermost = self._pending is None
+            if outermost:
+                self._pending = _Pending(self.dimension, self.dtype)
+        if not outermost:
+            yield
+            return
+        try:
+            yield
+        except BaseException:
+            with self._write_lock:
+                self._pending = None
+            raise
+        with self._write_lock:
+            pending, self._pending = self._pending, None
+            if pending.ids:
+                self._commit(pending)
+
+    def add(self, chunks: List[dict]):
+        """Embed and add (or replace) chunks; also compacts deleted rows."""
+        if not chunks:
+            return
+        vectors = self.embed([chunk["content"] for chunk in chunks]).astype(self.dtype, copy=False)
+        with self.bulk(), self._write_lock:
+            self._pending.extend([chunk["id"] for chunk in chunks], vectors)
+
+    def _commit(self, pending: "_Pending"):
+        """Write the live rows plus the buffered ones as a new matrix (lock held)."""
+        state = self._state
+        keep = [row for row, cid in enumerate(state.ids) if cid not in self._dead and cid not in pending.row_of]
+        vectors = pending.matrix()
+        matrix = np.concatenate([np.asarray(state.matrix[keep]), vectors]) if keep else vectors
+        ids = [state.ids[row] for row in keep] + pending.ids
+
+        self._dead.clear()
+        self._swap(self._write(ids, np.ascontiguousarray(matrix)))
+
+    def remove(self, ids: List[str]):
+        """Delete chunks. Rows are only masked until enough accumulate to compact."""
+        if not ids:
+            return
+        with self._write_lock:
+            state = self._state
+            self._dead.update(cid for cid in ids if cid in state.row_of)
+            if len(self._dead) <= self.compact_ratio * len(state.ids):
+                self._mask_cache = (None, None)
+                self._write_meta(state, self._dead)
+                return
+
+            keep = [row for row, cid in enumerate(state.ids) if cid not in self._dead]
+            matrix = np.asarray(state.matrix[keep]) if keep else np.zeros((0, self.dimension), dtype=self.dtype)
+            self._dead.clear()
+            self._swap(self._write([state.ids[row] for row in keep], np.ascontiguousarray(matrix)))
+
+    # -- search ----------------------------------------------------------
+
+    def _mask(self, state: _State, live: Optional[Dict[str, dict]], version: Optional[int]) -> Optional[np.ndarray]:
+        """Boolean mask of rows visible to the caller's snapshot, cached per snapshot version."""
+        if live is None and not self._dead:
+            return None
+        cached_version, cached_mask = self._mask_cache
+        if version is not None and cached_version == (version, id(state)) and cached_mask is not None:
+            return cached_mask
+        dead = self._dead
+        mask = np.fromiter(
+            ((live is None or cid in live) and cid not in dead for cid in state.ids),
+            dtype=bool, count=len(state.ids)
+        )
+        if version is not None:
+            self._mask_cache = ((version, id(state)), mask)
+        return mask
+
+    def _scores(self, matrix: np.ndarray, queries: np.ndarray) -> np.ndarray:
+        """Return (rows, n_queries) cosine similarities."""
+        if matrix.dtype == np.float32:
+            return matrix @ queries.T
+        out = np.empty((matrix.shape[0], queries.shape[0]), dtype=np.float32)
+        for start in range(0, matrix.shape[0], _BLOCK_ROWS):
+            block = np.asarray(matrix[start:start + _BLOCK_ROWS], dtype=np.float32)
+            out[start:start + len(block)] = block @ queries.T
+        return out
+
+    def search_batch(self, queries: np.ndarray, top_k: int,
+                     live: Optional[Dict[str, dict]] = None,
+                     version: Optional[int] = None) -> List[List[Tuple[float, str]]]:
+        """Return the top_k (similarity, id) pairs for each query row.
+
+        Args:
+            queries: (n, dimension) unit-length float32 query embeddings.
+            live: Optional id -> chunk map; rows whose id is missing are skipped.
+            version: Snapshot version of `live`, used to cache the row mask.
+        """
+        state = self._state
+        n_rows = len(state.ids)
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if n_rows == 0 or top_k <= 0:
+            return [[] for _ in range(len(queries))]
+
+        scores = self._scores(state.matrix, queries)
+        mask = self._mask(state, live, version)
+        if mask is not None:
+            scores[~mask] = -np.inf
+            n_candidates = int(mask.sum())
+        else:
+            n_candidates = n_rows
+        k = min(top_k, n_candidates)
+
+        results = []
+        for column in scores.T:
+            if k == 0:
+                results.append([])
+                continue
+            top = np.argpartition(-column, k - 1)[:k] if k < n_rows else np.arange(n_rows)
+            top = top[np.argsort(-column[top])]
+            results.append([(float(column[row]), state.ids[row]) for row in top if np.isfinite(column[row])][:k])
+        return results
+
+    def search(self, query: np.ndarray, top_k: int,
+               live: Optional[Dict[str, dict]] = None,
+               version: Optional[int] = None) -> List[Tuple[float, str]]:
+        """Return the top_k (similarity, id) pairs for one query embedding."""
+        return self.search_batch(np.asarray(query)[None, :], top_k, live, version)[0]
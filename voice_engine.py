@@ -3,17 +3,74 @@ Voice Engine - Text-to-Speech using ElevenLabs
 """
 
 import os
+import random
 import requests
 import sys
+import threading
+import time
+from typing import Iterator, Optional
+
+from requests.adapters import HTTPAdapter
+
+from audio_cache import AudioCache
+from metrics import metrics
+
+API_BASE = "https://api.elevenlabs.io/v1/text-to-speech"
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class TTSDeadlineExceeded(Exception):
+    """Raised when a TTS call runs out of its overall time budget."""
+
 
 class VoiceEngine:
     def __init__(self):
         self.api_key = os.getenv("ELEVENLABS_API_KEY")
         self.voice_id = os.getenv("ELEVENLABS_VOICE_ID", "JBFqnCBsd6RMkjVDRZzb")
-        
+        self.model_id = "eleven_monolingual_v1"
+        self.voice_settings = {
+            "stability": 0.5,
+            "similarity_boost": 0.5
+        }
+
+        # Content-addressed audio cache shared by every process using the directory
+        cache_dir = os.getenv("TTS_CACHE_DIR", ".teammind_audio")
+        self.audio_cache = None
+        if cache_dir:
+            max_mb = int(os.getenv("TTS_CACHE_MAX_MB", "256"))
+            self.audio_cache = AudioCache(cache_dir, max_bytes=max_mb * 1024 * 1024)
+
+        # Timeouts (seconds): connect / per-read, and an overall per-call deadline
+        self.connect_timeout = float(os.getenv("TTS_CONNECT_TIMEOUT", "3.05"))
+        self.read_timeout = float(os.getenv("TTS_READ_TIMEOUT", "15"))
+        self.deadline = float(os.getenv("TTS_DEADLINE", "30"))
+        self.max_retries = int(os.getenv("TTS_MAX_RETRIES", "2"))
+        self.backoff_base = 0.25
+        self.backoff_cap = 4.0
+
+        # Keep-alive connection pool reused by every call (and every thread)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=16, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "xi-api-key": self.api_key or ""
+        })
+
         # Windows encoding safety
         self.safe_stdout = sys.stdout
 
+        metrics.register_collector("voice_engine", self.metrics_gauges)
+
+    def metrics_gauges(self) -> dict:
+        """Audio cache hit ratio, read when metrics are scraped."""
+        if not self.audio_cache:
+            return {}
+        total = self.audio_cache.hits + self.audio_cache.misses
+        return {"audio_cache_hit_ratio": self.audio_cache.hits / total if total else 0.0}
+
     def _safe_print(self, text):
         try:
             print(text)
@@ -22,43 +79,169 @@ class VoiceEngine:
                 self.safe_stdout.buffer.write(text.encode('utf-8'))
                 self.safe_stdout.buffer.write(b'\n')
 
-    def generate_audio(self, text: str):
-        """
-        Generate audio from text using ElevenLabs API.
-        Returns:
-            bytes: Audio content
-        """
+    def _configured(self) -> bool:
         if not self.api_key or "your_elevenlabs_key" in self.api_key:
             self._safe_print("⚠️ ElevenLabs API key not configured.")
+            return False
+        return True
+
+    def _cache_key(self, text: str) -> Optional[str]:
+        if not self.audio_cache:
             return None
+        return AudioCache.make_key(text, self.voice_id, self.model_id, self.voice_settings)
 
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{self.voice_id}"
+    def _cache_put(self, cache_key: Optional[str], audio: bytes):
+        if not cache_key:
+            return
+        try:
+            self.audio_cache.put(cache_key, audio)
+        except OSError as e:
+            self._safe_print(f"⚠️ Could not cache audio: {e}")
 
-        headers = {
-            "Accept": "audio/mpeg",
-            "Content-Type": "application/json",
-            "xi-api-key": self.api_key
-        }
+    def _post(self, url: str, text: str, deadline_at: float) -> requests.Response:
+        """POST with timeouts and bounded, jittered retries inside the call deadline.
 
+        The response is streamed: read its body with _read_body() so the
+        download is held to the same deadline.
+        """
         data = {
             "text": text,
-            "model_id": "eleven_monolingual_v1",
-            "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.5
-            }
+            "model_id": self.model_id,
+            "voice_settings": self.voice_settings
         }
 
+        attempt = 0
+        while True:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                raise TTSDeadlineExceeded(f"TTS call exceeded its {self.deadline:.0f}s deadline")
+
+            # No single connect or read may outlast what is left of the deadline
+            timeout = (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+            try:
+                response = self.session.post(
+                    url, json=data, headers={"Accept": "audio/mpeg"}, timeout=timeout, stream=True
+                )
+                if response.status_code not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                    return response
+                response.close()
+                reason = f"HTTP {response.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                reason = type(e).__name__
+
+            # Exponential backoff with jitter, never sleeping past the deadline
+            attempt += 1
+            delay = min(self.backoff_cap, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+            delay = min(delay, max(0.0, deadline_at - time.monotonic()))
+            self._safe_print(f"⚠️ ElevenLabs {reason}, retrying in {delay:.2f}s ({attempt}/{self.max_retries})")
+            time.sleep(delay)
+
+    def _read_body(self, response: requests.Response, deadline_at: float,
+                   chunk_size: int = 4096) -> Iterator[bytes]:
+        """Yield the body chunk by chunk; raises TTSDeadlineExceeded once the deadline passes."""
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if time.monotonic() > deadline_at:
+                raise TTSDeadlineExceeded(f"TTS call exceeded its {self.deadline:.0f}s deadline")
+            if chunk:
+                yield chunk
+
+    def generate_audio(self, text: str):
+        """
+        Generate audio from text using ElevenLabs API.
+        Returns:
+            bytes: Audio content
+        """
+        with metrics.span("generate_audio") as span:
+            audio = self._generate_audio(text, span)
+            if audio is None:
+                metrics.inc("tts_failures_total")
+            return audio
+
+    def _generate_audio(self, text: str, span: dict):
+        cache_key = self._cache_key(text)
+        if cache_key:
+            cached = self.audio_cache.get(cache_key)
+            if cached is not None:
+                span["cached"] = True
+                return cached
+
+        if not self._configured():
+            return None
+
+        url = f"{API_BASE}/{self.voice_id}"
+
         try:
-            response = requests.post(url, json=data, headers=headers)
-            
-            if response.status_code == 200:
-                self._safe_print("✅ Audio generated successfully!")
-                return response.content
-            else:
-                self._safe_print(f"⚠️ ElevenLabs Error: {response.text}")
-                return None
-                
+            deadline_at = time.monotonic() + self.deadline
+            with self._post(url, text, deadline_at) as response:
+                if response.status_code != 200:
+                    self._safe_print(f"⚠️ ElevenLabs Error: {response.text}")
+                    return None
+                audio = b"".join(self._read_body(response, deadline_at))
+
+            self._safe_print("✅ Audio generated successfully!")
+            self._cache_put(cache_key, audio)
+            return audio
+
         except Exception as e:
             self._safe_print(f"⚠️ Error formatting voice request: {e}")
             return None
+
+    def stream_audio(self, text: str, chunk_size: int = 4096) -> Iterator[bytes]:
+        """
+        Stream audio from the ElevenLabs streaming endpoint chunk by chunk,
+        so playback can start before synthesis finishes.
+
+        The complete audio is added to the cache once the stream ends; a
+        cache hit is returned as a single chunk. Yields nothing on error.
+        """
+        cache_key = self._cache_key(text)
+        if cache_key:
+            cached = self.audio_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        if not self._configured():
+            return
+
+        url = f"{API_BASE}/{self.voice_id}/stream"
+        deadline_at = time.monotonic() + self.deadline
+
+        try:
+            response = self._post(url, text, deadline_at)
+        except Exception as e:
+            self._safe_print(f"⚠️ Error formatting voice request: {e}")
+            return
+
+        with response:
+            if response.status_code != 200:
+                self._safe_print(f"⚠️ ElevenLabs Error: {response.text}")
+                return
+
+            parts = []
+            try:
+                for chunk in self._read_body(response, deadline_at, chunk_size):
+                    parts.append(chunk)
+                    yield chunk
+            except Exception as e:
+                # Partial audio is never cached
+                self._safe_print(f"⚠️ Error streaming audio: {e}")
+                return
+
+        self._cache_put(cache_key, b"".join(parts))
+
+
+_voice_engine = None
+_voice_engine_lock = threading.Lock()
+
+
+def get_voice_engine() -> VoiceEngine:
+    """Return the process-wide VoiceEngine (one connection pool for all sessions)."""
+    global _voice_engine
+    if _voice_engine is None:
+        with _voice_engine_lock:
+            if _voice_engine is None:
+                _voice_engine = VoiceEngine()
+    return _voice_engine
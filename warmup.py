@@ -0,0 +1,202 @@
+"""
+Warm-up - Answers, narration and audio for the quick topics, computed ahead of time
+
+The quick-topic buttons ask the same few questions over and over, yet every
+click paid for retrieval, generation, the voice script and TTS. A warm-up job
+answers each hot question in each chat mode in the background, narrates the
+answer and keeps the result, so a click is served from memory.
+
+The registry schedules a job when an engine is built, reloaded or refreshed.
+Each job belongs to one engine and one index version: a new job cancels the
+previous one, and stored answers are only served while the engine's index
+is still at the version they were built from. At most `concurrency`
+questions are worked on at once, so warm-up never competes with users for
+more than a couple of model calls.
+
+- RAG_HOT_QUESTIONS: file with one question per line (default: QUICK_TOPICS)
+- RAG_WARMUP=0 disables warm-up; RAG_WARMUP_CONCURRENCY (default 2)
+- RAG_WARMUP_AUDIO=0 skips TTS (answers and scripts are still warmed)
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from metrics import metrics
+from narration import narrate
+from rag_engine import MODE_PREFIXES, RAGEngine
+from response_cache import normalize_query
+
+logger = logging.getLogger(__name__)
+
+QUICK_TOPICS = [
+    "How do I set up my environment?",
+    "What's the deployment process?",
+    "Who should I contact for help?",
+    "What tools does the team use?"
+]
+
+
+def hot_questions() -> List[str]:
+    """The questions to warm (and show as quick topics)."""
+    path = os.getenv("RAG_HOT_QUESTIONS")
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                questions = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+            if questions:
+                return questions
+        except OSError as e:
+            logger.warning("Could not read RAG_HOT_QUESTIONS (%s); using the default quick topics", e)
+    return list(QUICK_TOPICS)
+
+
+class _Job:
+    """One warm-up pass over the hot questions for one engine and index version."""
+
+    def __init__(self, engine: RAGEngine, items: List[Tuple[str, str]]):
+        self.engine = engine
+        self.version = engine.snapshot.version
+        self.items = items
+        self.entries: Dict[Tuple[str, str], dict] = {}
+        self.done = 0
+        self.failed = 0
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancelled = threading.Event()
+
+
+class Warmer:
+    """Runs warm-up jobs for one knowledge base and serves their answers."""
+
+    def __init__(self, questions: Optional[Sequence[str]] = None, modes: Optional[Sequence[str]] = None,
+                 concurrency: Optional[int] = None, audio: Optional[bool] = None):
+        """
+        Args:
+            questions: Questions to warm; defaults to hot_questions().
+            modes: Chat modes (keys of MODE_PREFIXES) to warm each question in.
+            concurrency: Questions worked on at once.
+            audio: Synthesize narration audio too.
+        """
+        self.questions = list(questions) if questions is not None else hot_questions()
+        self.modes = list(modes) if modes is not None else list(MODE_PREFIXES)
+        self.concurrency = concurrency or int(os.getenv("RAG_WARMUP_CONCURRENCY", "2"))
+        self.audio = audio if audio is not None else os.getenv("RAG_WARMUP_AUDIO", "1") != "0"
+        self._lock = threading.Lock()
+        self._job: Optional[_Job] = None
+        metrics.register_collector("warmup", self.metrics_gauges)
+
+    def schedule(self, engine: RAGEngine):
+        """Start warming for `engine`'s current index, replacing any running job."""
+        items = [(question, MODE_PREFIXES[mode]) for mode in self.modes for question in self.questions]
+        job = _Job(engine, items)
+        with self._lock:
+            previous, self._job = self._job, job
+        if previous is not None:
+            previous.cancelled.set()
+        threading.Thread(target=self._run, args=(job,), name="warmup", daemon=True).start()
+
+    def _run(self, job: _Job):
+        with metrics.span("warmup") as span:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="warmup") as pool:
+                for question, context_prefix in job.items:
+                    pool.submit(self._warm_one, job, question, context_prefix)
+            job.finished_at = time.time()
+            span.update(questions=len(job.items), warmed=len(job.entries), failed=job.failed,
+                        cancelled=job.cancelled.is_set())
+        if not job.cancelled.is_set():
+            logger.info("Warmed %d/%d quick-topic answers (index version %s) in %.1fs",
+                        len(job.entries), len(job.items), job.version, job.finished_at - job.started_at)
+
+    def _warm_one(self, job: _Job, question: str, context_prefix: str):
+        if job.cancelled.is_set():
+            return
+        engine = job.engine
+        try:
+            response = engine.warm(question, context_prefix)
+            if response is None:
+                # Fallback or error answer: not worth keeping
+                with self._lock:
+                    job.failed += 1
+                return
+            segments = []
+            if self.audio:
+                from voice_engine import get_voice_engine
+                voice = get_voice_engine()
+                segments = list(narrate(
+                    response["answer"], response.get("narration", ""), engine.summarize_for_voice_stream,
+                    voice.generate_audio, key=engine.flight_key(question, context_prefix)
+                ))
+            script = " ".join(sentence for sentence, _ in segments) or response.get("narration", "")
+            job.entries[(normalize_query(question), context_prefix)] = {
+                "answer": response["answer"],
+                "sources": response["sources"],
+                "narration": script,
+                "audio": b"".join(audio for _, audio in segments if audio) or None,
+                "version": job.version,
+                "warmed_at": time.time()
+            }
+        except Exception as e:
+            with self._lock:
+                job.failed += 1
+            logger.warning("Warm-up failed for %r: %s", question, e)
+        finally:
+            with self._lock:
+                job.done += 1
+
+    def lookup(self, engine: RAGEngine, question: str, context_prefix: str) -> Optional[dict]:
+        """The warmed answer for a question, if it is still current for `engine`.
+
+        Returns:
+            dict: "answer", "sources", "narration" (the voice script) and
+            "audio" (MP3 bytes or None), plus "version" and "warmed_at".
+        """
+        job = self._job
+        if job is None or job.engine is not engine or job.version != engine.snapshot.version:
+            return None
+        entry = job.entries.get((normalize_query(question), context_prefix))
+        if entry is not None:
+            engine.record_prewarmed(entry)
+        return entry
+
+    def status(self) -> dict:
+        """Progress and freshness of the latest job."""
+        job = self._job
+        if job is None:
+            return {"state": "idle", "total": 0, "done": 0, "warmed": 0, "failed": 0}
+        if job.finished_at is None:
+            state = "running"
+        elif job.cancelled.is_set():
+            state = "cancelled"
+        else:
+            state = "done"
+        return {
+            "state": state,
+            "total": len(job.items),
+            "done": job.done,
+            "warmed": len(job.entries),
+            "failed": job.failed,
+            "version": job.version,
+            # Answers are only served while the index is still at this version
+            "fresh": job.version == job.engine.snapshot.version,
+            "age_seconds": time.time() - job.finished_at if job.finished_at else None
+        }
+
+    def metrics_gauges(self) -> Dict[str, float]:
+        status = self.status()
+        gauges = {
+            "warmup_progress": status["done"] / status["total"] if status["total"] else 0.0,
+            "warmup_answers": status["warmed"] if status.get("fresh") else 0
+        }
+        if status.get("age_seconds") is not None:
+            gauges["warmup_age_seconds"] = status["age_seconds"]
+        return gauges
+
+    def cancel(self):
+        """Stop the running job (its finished answers stay servable)."""
+        job = self._job
+        if job is not None:
+            job.cancelled.set()